@@ -1,9 +1,17 @@
 import pandas as pd
 import json
+import re
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from itertools import islice
 from datetime import datetime, timedelta
 import logging
 from typing import List, Dict, Any
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential, wait_random
 import os
 from dotenv import load_dotenv
 
@@ -12,6 +20,51 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Transient Gemini failures worth retrying; auth and request errors fail immediately
+RETRYABLE_GEMINI_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError
+)
+
+# Gemini summaries for recent payloads, keyed by the summary_data hash and shared by
+# every generator, so a dashboard rerun with a new AISummaryGenerator still hits it
+GEMINI_CACHE_SIZE = 256
+_gemini_cache = OrderedDict()
+_gemini_cache_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def get_gemini_model(api_key: str):
+    """
+    Configure Gemini once and share a single GenerativeModel (and its gRPC channel) per process
+    """
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-pro')
+
+@functools.lru_cache(maxsize=1)
+def sample_changes():
+    """
+    Two-row change log used when no real changes are available; shared, so treat it as read-only
+    """
+    return pd.DataFrame({
+        'CIN': ['U24299PN2019PTC181506', 'U24299PN2019PTC187808'],
+        'Change_Type': ['New Incorporation', 'Field Update'],
+        'Field_Changed': ['All', 'Status'],
+        'Old_Value': ['', 'Active'],
+        'New_Value': ['ANURIUSWELL PHARMACEUTICALS', 'Strike Off'],
+        'Date': pd.Timestamp('2025-10-19'),
+        'Company_Name': ['ANURIUSWELL PHARMACEUTICALS', 'SKYI FKUR BIOPOLYMERS'],
+        'State': ['Maharashtra', 'Maharashtra'],
+        'Status': ['Active', 'Strike Off']
+    }).astype({
+        'CIN': 'string',
+        'Change_Type': 'category',
+        'Field_Changed': 'category',
+        'State': 'category',
+        'Status': 'category'
+    })
+
 class AISummaryGenerator:
     """
     Class to generate AI-powered summaries of daily changes
@@ -20,8 +73,7 @@ class AISummaryGenerator:
     def __init__(self, api_key=None):
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = get_gemini_model(self.api_key)
         else:
             logger.warning("Gemini API key not found. Using mock summaries.")
             self.model = None
@@ -45,13 +97,22 @@ class AISummaryGenerator:
         """
         Prepare structured data for AI analysis
         """
+        # Single pass over Change_Type instead of one boolean mask per type;
+        # lookups are by key so the counts need no sorting
+        change_type_counts = changes_df['Change_Type'].value_counts(sort=False)
+        
+        # Categorical columns count over integer codes but also report unobserved
+        # categories, so zero counts are dropped
+        state_counts = changes_df['State'].value_counts()
+        field_counts = changes_df['Field_Changed'].value_counts()
+        
         summary_data = {
             'total_changes': len(changes_df),
-            'new_incorporations': len(changes_df[changes_df['Change_Type'] == 'New Incorporation']),
-            'deregistrations': len(changes_df[changes_df['Change_Type'] == 'Deregistration']),
-            'field_updates': len(changes_df[changes_df['Change_Type'] == 'Field Update']),
-            'states_affected': changes_df['State'].value_counts().to_dict(),
-            'top_fields_changed': changes_df['Field_Changed'].value_counts().head(5).to_dict(),
+            'new_incorporations': int(change_type_counts.get('New Incorporation', 0)),
+            'deregistrations': int(change_type_counts.get('Deregistration', 0)),
+            'field_updates': int(change_type_counts.get('Field Update', 0)),
+            'states_affected': state_counts[state_counts > 0].to_dict(),
+            'top_fields_changed': field_counts[field_counts > 0].head(5).to_dict(),
             'date_range': {
                 'start': changes_df['Date'].min(),
                 'end': changes_df['Date'].max()
@@ -68,7 +129,8 @@ class AISummaryGenerator:
             prompt = f"""
             Based on the following MCA company data changes, generate a concise daily summary report:
             
-            Data: {json.dumps(summary_data, default=str)}
+            Data:
+            {self._format_compact(summary_data)}
             
             Please provide:
             1. A brief overview of the day's activity
@@ -79,8 +141,11 @@ class AISummaryGenerator:
             Keep the summary professional and informative, suitable for business stakeholders.
             """
             
-            response = self.model.generate_content(prompt)
-            summary = response.text
+            # Identical payloads (e.g. repeated dashboard refreshes) reuse the cached response
+            prompt_hash = hashlib.sha1(
+                json.dumps(summary_data, sort_keys=True, default=str).encode()
+            ).hexdigest()
+            summary = self._call_gemini(prompt_hash, prompt)
             
             return {
                 'generated_at': datetime.now().isoformat(),
@@ -93,11 +158,64 @@ class AISummaryGenerator:
             logger.error(f"Error generating AI summary: {str(e)}")
             return self._generate_mock_summary(summary_data)
     
+    def _format_compact(self, summary_data):
+        """
+        Render summary_data as terse key: value lines to keep the prompt small
+        """
+        def top_items(counts, limit=5):
+            return ', '.join(f"{key} {value}" for key, value in list(counts.items())[:limit] if value)
+        
+        lines = [f"Total changes: {summary_data['total_changes']}"]
+        for label, key in [('New incorporations', 'new_incorporations'),
+                           ('Deregistrations', 'deregistrations'),
+                           ('Field updates', 'field_updates')]:
+            if summary_data[key]:
+                lines.append(f"{label}: {summary_data[key]}")
+        if summary_data['states_affected']:
+            lines.append(f"Top states: {top_items(summary_data['states_affected'])}")
+        if summary_data['top_fields_changed']:
+            lines.append(f"Top fields: {top_items(summary_data['top_fields_changed'])}")
+        lines.append(f"Period: {summary_data['date_range']['start']} to {summary_data['date_range']['end']}")
+        
+        return '\n'.join(lines)
+    
+    def _call_gemini(self, prompt_hash, prompt_text):
+        """
+        Call Gemini for a prompt, reusing the response cached under the summary_data content hash
+        """
+        with _gemini_cache_lock:
+            if prompt_hash in _gemini_cache:
+                _gemini_cache.move_to_end(prompt_hash)
+                return _gemini_cache[prompt_hash]
+        
+        text = self._generate_content_with_retry(prompt_text).text
+        
+        with _gemini_cache_lock:
+            _gemini_cache[prompt_hash] = text
+            _gemini_cache.move_to_end(prompt_hash)
+            while len(_gemini_cache) > GEMINI_CACHE_SIZE:
+                _gemini_cache.popitem(last=False)
+        
+        return text
+    
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.5, max=8) + wait_random(0, 1),
+        retry=retry_if_exception_type(RETRYABLE_GEMINI_ERRORS),
+        reraise=True
+    )
+    def _generate_content_with_retry(self, prompt_text):
+        """
+        Call Gemini, backing off with jitter on rate limits and transient outages
+        """
+        return self.model.generate_content(prompt_text)
+    
     def _generate_mock_summary(self, summary_data):
         """
         Generate mock summary when AI is not available
         """
-        summary_content = f"""
+        # Collect the pieces and join once rather than growing a string with +=
+        parts = [f"""
         MCA Daily Change Summary - {datetime.now().strftime('%Y-%m-%d')}
         
         OVERVIEW:
@@ -109,22 +227,28 @@ class AISummaryGenerator:
         • Field Updates: {summary_data['field_updates']}
         
         STATE-WISE BREAKDOWN:
-        """
+        """]
         
-        for state, count in list(summary_data['states_affected'].items())[:5]:
-            summary_content += f"• {state}: {count} changes\n"
+        parts.extend(
+            f"• {state}: {count} changes\n"
+            for state, count in islice(summary_data['states_affected'].items(), 5)
+        )
         
-        summary_content += f"""
+        parts.append("""
         TOP FIELDS MODIFIED:
-        """
+        """)
         
-        for field, count in list(summary_data['top_fields_changed'].items())[:3]:
-            summary_content += f"• {field}: {count} updates\n"
+        parts.extend(
+            f"• {field}: {count} updates\n"
+            for field, count in islice(summary_data['top_fields_changed'].items(), 3)
+        )
         
-        summary_content += f"""
+        parts.append(f"""
         INSIGHTS:
-        The data shows active corporate activity with a focus on {list(summary_data['top_fields_changed'].keys())[0] if summary_data['top_fields_changed'] else 'various'} modifications.
-        """
+        The data shows active corporate activity with a focus on {next(iter(summary_data['top_fields_changed']), 'various')} modifications.
+        """)
+        
+        summary_content = ''.join(parts)
         
         return {
             'generated_at': datetime.now().isoformat(),
@@ -163,12 +287,54 @@ class ConversationalQueryEngine:
     Class to handle conversational queries about MCA data
     """
     
+    # Fixed SQL texts so sqlite3's per-connection statement cache reuses the compiled statements
+    _SQL_CHANGES_BY_STATE = """
+        SELECT COUNT(*) as count, State 
+        FROM company_changes 
+        WHERE Change_Type = ? 
+        GROUP BY State
+    """
+    
+    _SQL_TOP_INDUSTRIES = """
+        SELECT Industry_Classification, COUNT(*) as count 
+        FROM companies 
+        WHERE Industry_Classification IS NOT NULL 
+        GROUP BY Industry_Classification 
+        ORDER BY count DESC 
+        LIMIT 10
+    """
+    
+    _SQL_CAPITAL_STATS = """
+        SELECT AVG(AuthorizedCapital) as avg_capital, 
+               MAX(AuthorizedCapital) as max_capital,
+               COUNT(*) as total_companies
+        FROM companies 
+        WHERE AuthorizedCapital > 0
+    """
+    
+    _SQL_STATUS_BY_STATE = """
+        SELECT COUNT(*) as count, Status 
+        FROM companies 
+        WHERE State = ? 
+        GROUP BY Status
+    """
+    
+    # Intent dispatch table, checked in order; the first matching pattern wins
+    _INTENT_PATTERNS = [
+        (re.compile(r'new incorporation|newly incorporated'), '_handle_new_incorporations_query'),
+        (re.compile(r'struck off|deregistered'), '_handle_deregistration_query'),
+        (re.compile(r'manufacturing|sector'), '_handle_sector_query'),
+        (re.compile(r'capital'), '_handle_capital_query'),
+        (re.compile(r'maharashtra|gujarat|state'), '_handle_state_query')
+    ]
+    
+    _STATE_RE = re.compile(r'(maharashtra|gujarat|delhi|tamil nadu|karnataka)', re.IGNORECASE)
+    
     def __init__(self, db_path='mca_insights.db', api_key=None):
         self.db_path = db_path
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = get_gemini_model(self.api_key)
         else:
             logger.warning("Gemini API key not found. Using rule-based queries.")
             self.model = None
@@ -177,21 +343,32 @@ class ConversationalQueryEngine:
         """
         Process natural language query about MCA data
         """
-        query_lower = query.lower()
-        
         # Rule-based query processing
-        if 'new incorporation' in query_lower or 'newly incorporated' in query_lower:
-            return self._handle_new_incorporations_query(query, db_connection)
-        elif 'struck off' in query_lower or 'deregistered' in query_lower:
-            return self._handle_deregistration_query(query, db_connection)
-        elif 'manufacturing' in query_lower or 'sector' in query_lower:
-            return self._handle_sector_query(query, db_connection)
-        elif 'capital' in query_lower:
-            return self._handle_capital_query(query, db_connection)
-        elif 'maharashtra' in query_lower or 'gujarat' in query_lower or 'state' in query_lower:
-            return self._handle_state_query(query, db_connection)
-        else:
-            return self._handle_general_query(query, db_connection)
+        handler_name = self._intent_handler(query.lower())
+        return getattr(self, handler_name)(query, db_connection)
+    
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _intent_handler(cls, query_lower):
+        """
+        Name of the handler for a lowercased query, memoized since canned queries repeat
+        """
+        for pattern, handler_name in cls._INTENT_PATTERNS:
+            if pattern.search(query_lower):
+                return handler_name
+        
+        return '_handle_general_query'
+    
+    def process_queries(self, queries: List[str], db_connection=None):
+        """
+        Process a batch of queries over one connection, answering repeated queries once
+        """
+        responses = {}
+        for query in queries:
+            if query not in responses:
+                responses[query] = self.process_query(query, db_connection)
+        
+        return [responses[query] for query in queries]
     
     def _handle_new_incorporations_query(self, query, db_connection):
         """
@@ -200,12 +377,7 @@ class ConversationalQueryEngine:
         try:
             if db_connection:
                 cursor = db_connection.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) as count, State 
-                    FROM company_changes 
-                    WHERE Change_Type = 'New Incorporation' 
-                    GROUP BY State
-                """)
+                cursor.execute(self._SQL_CHANGES_BY_STATE, ('New Incorporation',))
                 results = cursor.fetchall()
                 
                 response = "New Incorporations by State:\n"
@@ -227,12 +399,7 @@ class ConversationalQueryEngine:
         try:
             if db_connection:
                 cursor = db_connection.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) as count, State 
-                    FROM company_changes 
-                    WHERE Change_Type = 'Deregistration' 
-                    GROUP BY State
-                """)
+                cursor.execute(self._SQL_CHANGES_BY_STATE, ('Deregistration',))
                 results = cursor.fetchall()
                 
                 response = "Deregistrations by State:\n"
@@ -254,14 +421,7 @@ class ConversationalQueryEngine:
         try:
             if db_connection:
                 cursor = db_connection.cursor()
-                cursor.execute("""
-                    SELECT Industry_Classification, COUNT(*) as count 
-                    FROM companies 
-                    WHERE Industry_Classification IS NOT NULL 
-                    GROUP BY Industry_Classification 
-                    ORDER BY count DESC 
-                    LIMIT 10
-                """)
+                cursor.execute(self._SQL_TOP_INDUSTRIES)
                 results = cursor.fetchall()
                 
                 response = "Top Industries by Company Count:\n"
@@ -283,13 +443,7 @@ class ConversationalQueryEngine:
         try:
             if db_connection:
                 cursor = db_connection.cursor()
-                cursor.execute("""
-                    SELECT AVG(AuthorizedCapital) as avg_capital, 
-                           MAX(AuthorizedCapital) as max_capital,
-                           COUNT(*) as total_companies
-                    FROM companies 
-                    WHERE AuthorizedCapital > 0
-                """)
+                cursor.execute(self._SQL_CAPITAL_STATS)
                 result = cursor.fetchone()
                 
                 if result:
@@ -314,22 +468,12 @@ class ConversationalQueryEngine:
         try:
             if db_connection:
                 # Extract state name from query
-                states = ['maharashtra', 'gujarat', 'delhi', 'tamil nadu', 'karnataka']
-                mentioned_state = None
-                
-                for state in states:
-                    if state in query.lower():
-                        mentioned_state = state.title()
-                        break
+                match = self._STATE_RE.search(query)
+                mentioned_state = match.group(1).lower().title() if match else None
                 
                 if mentioned_state:
                     cursor = db_connection.cursor()
-                    cursor.execute("""
-                        SELECT COUNT(*) as count, Status 
-                        FROM companies 
-                        WHERE State = ? 
-                        GROUP BY Status
-                    """, (mentioned_state,))
+                    cursor.execute(self._SQL_STATUS_BY_STATE, (mentioned_state,))
                     results = cursor.fetchall()
                     
                     response = f"Company Status in {mentioned_state}:\n"
@@ -356,22 +500,9 @@ if __name__ == "__main__":
     # Test AI Summary Generator
     print("Testing AI Summary Generator...")
     
-    # Create sample changes data
-    sample_changes = pd.DataFrame({
-        'CIN': ['U24299PN2019PTC181506', 'U24299PN2019PTC187808'],
-        'Change_Type': ['New Incorporation', 'Field Update'],
-        'Field_Changed': ['All', 'Status'],
-        'Old_Value': ['', 'Active'],
-        'New_Value': ['ANURIUSWELL PHARMACEUTICALS', 'Strike Off'],
-        'Date': [datetime.now(), datetime.now()],
-        'Company_Name': ['ANURIUSWELL PHARMACEUTICALS', 'SKYI FKUR BIOPOLYMERS'],
-        'State': ['Maharashtra', 'Maharashtra'],
-        'Status': ['Active', 'Strike Off']
-    })
-    
     # Generate summary
     summary_gen = AISummaryGenerator()
-    summary = summary_gen.generate_daily_summary(sample_changes)
+    summary = summary_gen.generate_daily_summary(sample_changes())
     print(f"Generated Summary: {summary['summary_type']}")
     print(summary['content'])
     
@@ -1,11 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, stream_with_context
 from flask_cors import CORS
+import os
 import sqlite3
-import pandas as pd
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from datetime import datetime
 import logging
 from ai_features import ConversationalQueryEngine
+from data_integration import SUMMARY_CACHE_SQL
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +17,33 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Most read queries a single request fans out at once (the dashboard stats)
+QUERIES_PER_REQUEST = 4
+
+# Runs independent read queries side by side; sqlite3 releases the GIL while a
+# statement executes and each pool thread holds its own connection. Sized so every
+# request thread of a gunicorn worker (API_THREADS) can fan out without queueing.
+query_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('API_THREADS', '8')) * QUERIES_PER_REQUEST,
+    thread_name_prefix='mca-sql'
+)
+
+# Precomputed aggregates older than this are recomputed from the live tables
+SUMMARY_CACHE_TTL_HOURS = int(os.getenv('SUMMARY_CACHE_TTL_HOURS', '24'))
+
+# Most queries /api/chat/batch answers in one request; each one holds the request
+# thread and may spend Gemini quota
+MAX_CHAT_BATCH = 50
+
+# Longest daily trend the changes analysis serves; also bounds its cache keys
+MAX_ANALYSIS_DAYS = 365
+
+def clamp_analysis_days(days):
+    """
+    Keep a requested trend length within 1..MAX_ANALYSIS_DAYS
+    """
+    return min(max(int(days), 1), MAX_ANALYSIS_DAYS)
+
 class MCAAPI:
     """
     REST API class for MCA Insights Engine
@@ -22,12 +52,114 @@ class MCAAPI:
     def __init__(self, db_path='mca_insights.db'):
         self.db_path = db_path
         self.query_engine = ConversationalQueryEngine(db_path)
+        self._tls = threading.local()
+        # Checked once per process; requests never probe or rebuild the schema themselves
+        self.summary_cache_ready, self.search_index_ready = self._probe_schema()
     
     def get_db_connection(self):
         """
-        Get database connection
+        Get the database connection for the current thread, opening it on first use
+        """
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=128)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            conn.execute('PRAGMA mmap_size=268435456')
+            # Keep ORDER BY / GROUP BY sort buffers in memory and let SQLite sort with helper threads
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA threads=4')
+            self._tls.conn = conn
+        return conn
+    
+    def fetch_records(self, conn, query, params=()):
+        """
+        Run a query and return its rows as a list of dicts
+        """
+        return [dict(row) for row in conn.execute(query, params).fetchall()]
+    
+    def fetch_concurrently(self, queries):
+        """
+        Run independent (query, params) pairs in parallel, returning their rows in order
+        """
+        futures = [query_executor.submit(self._fetch_in_worker, query, params) for query, params in queries]
+        return [future.result() for future in futures]
+    
+    def _fetch_in_worker(self, query, params):
+        """
+        Fetch records on the calling pool thread's own connection
         """
-        return sqlite3.connect(self.db_path)
+        return self.fetch_records(self.get_db_connection(), query, params)
+    
+    def _probe_schema(self):
+        """
+        Check which optional tables the API can use, without writing to or creating the database
+        
+        The pipeline (data integration, fix_database.py) creates them, so every server
+        worker only reads at startup.
+        """
+        try:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                names = {name for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE name IN ('summary_cache', 'companies_fts_ai')"
+                )}
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Database not available yet: {str(e)}")
+            return False, False
+        
+        if 'companies_fts_ai' not in names:
+            logger.warning("Company search index missing; run fix_database.py to rebuild it")
+        
+        return 'summary_cache' in names, 'companies_fts_ai' in names
+    
+    def _get_cached_summary(self, name):
+        """
+        Return a cached aggregate payload if it was refreshed within the TTL
+        """
+        if not self.summary_cache_ready:
+            return None
+        
+        row = self.get_db_connection().execute(
+            "SELECT payload FROM summary_cache WHERE name = ? AND refreshed_at >= datetime('now', ?)",
+            (name, f'-{SUMMARY_CACHE_TTL_HOURS} hours')
+        ).fetchone()
+        return orjson.loads(row['payload']) if row else None
+    
+    def _store_summary(self, name, payload):
+        """
+        Upsert an aggregate payload into the summary cache
+        """
+        if not self.summary_cache_ready:
+            return
+        
+        conn = self.get_db_connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO summary_cache (name, payload, refreshed_at) 
+                VALUES (?, ?, datetime('now')) 
+                ON CONFLICT(name) DO UPDATE SET payload = excluded.payload, refreshed_at = excluded.refreshed_at
+            """, (name, orjson.dumps(payload).decode()))
+    
+    def refresh_summary_cache(self, days=30):
+        """
+        Recompute the cached dashboard stats and changes analysis from the live tables
+        """
+        # An explicit maintenance run, so it may create the table an older database lacks
+        conn = self.get_db_connection()
+        with conn:
+            conn.execute(SUMMARY_CACHE_SQL)
+        self.summary_cache_ready = True
+        
+        stats = self.get_dashboard_stats(use_cache=False)
+        analysis = self.get_changes_analysis(days, use_cache=False)
+        logger.info("Summary cache refreshed")
+        
+        return bool(stats) and bool(analysis)
     
     def search_company(self, search_term, search_type='name'):
         """
@@ -35,18 +167,24 @@ class MCAAPI:
         """
         try:
             conn = self.get_db_connection()
+            column = 'CIN' if search_type.lower() == 'cin' else 'CompanyName'
             
-            if search_type.lower() == 'cin':
-                query = "SELECT * FROM companies WHERE CIN LIKE ?"
-                params = (f'%{search_term}%',)
+            # The trigram index answers substring matches of 3+ characters; shorter
+            # terms fall back to a LIKE scan
+            if len(search_term) >= 3 and self.search_index_ready:
+                query = """
+                    SELECT c.* FROM companies_fts f 
+                    JOIN companies c ON c.rowid = f.rowid 
+                    WHERE companies_fts MATCH ? 
+                    ORDER BY bm25(companies_fts)
+                """
+                phrase = search_term.replace('"', '""')
+                params = (f'{column} : "{phrase}"',)
             else:
-                query = "SELECT * FROM companies WHERE CompanyName LIKE ?"
+                query = f"SELECT * FROM companies WHERE {column} LIKE ?"
                 params = (f'%{search_term}%',)
             
-            df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
-            
-            return df.to_dict('records')
+            return self.fetch_records(conn, query, params)
             
         except Exception as e:
             logger.error(f"Error searching company: {str(e)}")
@@ -59,19 +197,21 @@ class MCAAPI:
         try:
             conn = self.get_db_connection()
             
-            # Get company details
-            company_query = "SELECT * FROM companies WHERE CIN = ?"
-            company_df = pd.read_sql_query(company_query, conn, params=(cin,))
+            # Get company details; only the first match is used
+            company_query = "SELECT * FROM companies WHERE CIN = ? LIMIT 1"
+            company_row = conn.execute(company_query, (cin,)).fetchone()
+            
+            # Unknown CINs skip the change history lookup entirely
+            if company_row is None:
+                return {'company': None, 'changes': []}
             
             # Get change history
             changes_query = "SELECT * FROM company_changes WHERE CIN = ? ORDER BY Date DESC"
-            changes_df = pd.read_sql_query(changes_query, conn, params=(cin,))
-            
-            conn.close()
+            change_rows = self.fetch_records(conn, changes_query, (cin,))
             
             result = {
-                'company': company_df.to_dict('records')[0] if not company_df.empty else None,
-                'changes': changes_df.to_dict('records')
+                'company': dict(company_row),
+                'changes': change_rows
             }
             
             return result
@@ -80,54 +220,58 @@ class MCAAPI:
             logger.error(f"Error getting company details: {str(e)}")
             return {'company': None, 'changes': []}
     
-    def get_dashboard_stats(self):
+    def get_dashboard_stats(self, use_cache=True):
         """
-        Get dashboard statistics
+        Get dashboard statistics, served from the summary cache when fresh
         """
         try:
-            conn = self.get_db_connection()
-            
-            # Company statistics
-            company_stats = pd.read_sql_query("""
-                SELECT 
-                    COUNT(*) as total_companies,
-                    COUNT(CASE WHEN Status = 'Active' THEN 1 END) as active_companies,
-                    AVG(AuthorizedCapital) as avg_authorized_capital,
-                    MAX(AuthorizedCapital) as max_authorized_capital
-                FROM companies
-            """, conn)
-            
-            # State distribution
-            state_dist = pd.read_sql_query("""
-                SELECT State, COUNT(*) as count 
-                FROM companies 
-                GROUP BY State 
-                ORDER BY count DESC
-            """, conn)
+            if use_cache:
+                cached = self._get_cached_summary('dashboard_stats')
+                if cached is not None:
+                    return cached
             
-            # Status distribution
-            status_dist = pd.read_sql_query("""
-                SELECT Status, COUNT(*) as count 
-                FROM companies 
-                GROUP BY Status 
-                ORDER BY count DESC
-            """, conn)
-            
-            # Recent changes
-            recent_changes = pd.read_sql_query("""
-                SELECT * FROM company_changes 
-                ORDER BY Date DESC 
-                LIMIT 10
-            """, conn)
-            
-            conn.close()
+            company_stats, state_dist, status_dist, recent_changes = self.fetch_concurrently([
+                # Company statistics
+                ("""
+                    SELECT 
+                        COUNT(*) as total_companies,
+                        COUNT(CASE WHEN Status = 'Active' THEN 1 END) as active_companies,
+                        AVG(AuthorizedCapital) as avg_authorized_capital,
+                        MAX(AuthorizedCapital) as max_authorized_capital
+                    FROM companies
+                """, ()),
+                
+                # State distribution
+                ("""
+                    SELECT State, COUNT(*) as count 
+                    FROM companies 
+                    GROUP BY State 
+                    ORDER BY count DESC
+                """, ()),
+                
+                # Status distribution
+                ("""
+                    SELECT Status, COUNT(*) as count 
+                    FROM companies 
+                    GROUP BY Status 
+                    ORDER BY count DESC
+                """, ()),
+                
+                # Recent changes
+                ("""
+                    SELECT * FROM company_changes 
+                    ORDER BY Date DESC 
+                    LIMIT 10
+                """, ())
+            ])
             
             stats = {
-                'company_stats': company_stats.to_dict('records')[0],
-                'state_distribution': state_dist.to_dict('records'),
-                'status_distribution': status_dist.to_dict('records'),
-                'recent_changes': recent_changes.to_dict('records')
+                'company_stats': company_stats[0],
+                'state_distribution': state_dist,
+                'status_distribution': status_dist,
+                'recent_changes': recent_changes
             }
+            self._store_summary('dashboard_stats', stats)
             
             return stats
             
@@ -135,44 +279,51 @@ class MCAAPI:
             logger.error(f"Error getting dashboard stats: {str(e)}")
             return {}
     
-    def get_changes_analysis(self, days=30):
+    def get_changes_analysis(self, days=30, use_cache=True):
         """
-        Get changes analysis for specified number of days
+        Get changes analysis for specified number of days, served from the summary cache when fresh
         """
+        days = clamp_analysis_days(days)
+        cache_name = f'changes_analysis:{days}'
+        
         try:
-            conn = self.get_db_connection()
-            
-            # Changes by type
-            changes_by_type = pd.read_sql_query("""
-                SELECT Change_Type, COUNT(*) as count 
-                FROM company_changes 
-                GROUP BY Change_Type
-            """, conn)
+            if use_cache:
+                cached = self._get_cached_summary(cache_name)
+                if cached is not None:
+                    return cached
             
-            # Changes by state
-            changes_by_state = pd.read_sql_query("""
-                SELECT State, COUNT(*) as count 
-                FROM company_changes 
-                GROUP BY State 
-                ORDER BY count DESC
-            """, conn)
-            
-            # Daily changes trend
-            daily_changes = pd.read_sql_query("""
-                SELECT DATE(Date) as date, COUNT(*) as count 
-                FROM company_changes 
-                GROUP BY DATE(Date) 
-                ORDER BY date DESC 
-                LIMIT ?
-            """, conn, params=(days,))
-            
-            conn.close()
+            changes_by_type, changes_by_state, daily_changes = self.fetch_concurrently([
+                # Changes by type
+                ("""
+                    SELECT Change_Type, COUNT(*) as count 
+                    FROM company_changes 
+                    GROUP BY Change_Type
+                """, ()),
+                
+                # Changes by state
+                ("""
+                    SELECT State, COUNT(*) as count 
+                    FROM company_changes 
+                    GROUP BY State 
+                    ORDER BY count DESC
+                """, ()),
+                
+                # Daily changes trend
+                ("""
+                    SELECT substr(Date, 1, 10) as date, COUNT(*) as count 
+                    FROM company_changes 
+                    GROUP BY substr(Date, 1, 10) 
+                    ORDER BY date DESC 
+                    LIMIT ?
+                """, (days,))
+            ])
             
             analysis = {
-                'changes_by_type': changes_by_type.to_dict('records'),
-                'changes_by_state': changes_by_state.to_dict('records'),
-                'daily_trend': daily_changes.to_dict('records')
+                'changes_by_type': changes_by_type,
+                'changes_by_state': changes_by_state,
+                'daily_trend': daily_changes
             }
+            self._store_summary(cache_name, analysis)
             
             return analysis
             
@@ -187,17 +338,34 @@ class MCAAPI:
         try:
             conn = self.get_db_connection()
             response = self.query_engine.process_query(query, conn)
-            conn.close()
             
             return response
             
         except Exception as e:
             logger.error(f"Error processing chat query: {str(e)}")
             return f"Sorry, I encountered an error: {str(e)}"
+    
+    def process_chat_queries(self, queries):
+        """
+        Process a batch of chat queries in a single round-trip
+        """
+        try:
+            conn = self.get_db_connection()
+            return self.query_engine.process_queries(queries, conn)
+            
+        except Exception as e:
+            logger.error(f"Error processing chat queries: {str(e)}")
+            return [f"Sorry, I encountered an error: {str(e)}"] * len(queries)
 
 # Initialize API
 api = MCAAPI()
 
+def json_response(payload, status=200):
+    """
+    Serialize a response payload with orjson, which is much faster than the stdlib encoder
+    """
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -205,7 +373,7 @@ def health_check():
     """
     Health check endpoint
     """
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'service': 'MCA Insights Engine API'
@@ -221,11 +389,11 @@ def search_company():
         search_type = request.args.get('type', 'name')  # 'name' or 'cin'
         
         if not search_term:
-            return jsonify({'error': 'Search term is required'}), 400
+            return json_response({'error': 'Search term is required'}, 400)
         
         results = api.search_company(search_term, search_type)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'results': results,
             'count': len(results),
@@ -235,7 +403,7 @@ def search_company():
         
     except Exception as e:
         logger.error(f"Error in search_company endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.route('/api/company/<cin>', methods=['GET'])
 def get_company(cin):
@@ -246,16 +414,16 @@ def get_company(cin):
         details = api.get_company_details(cin)
         
         if details['company'] is None:
-            return jsonify({'error': 'Company not found'}), 404
+            return json_response({'error': 'Company not found'}, 404)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': details
         })
         
     except Exception as e:
         logger.error(f"Error in get_company endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.route('/api/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
@@ -265,14 +433,14 @@ def get_dashboard_stats():
     try:
         stats = api.get_dashboard_stats()
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': stats
         })
         
     except Exception as e:
         logger.error(f"Error in get_dashboard_stats endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.route('/api/changes/analysis', methods=['GET'])
 def get_changes_analysis():
@@ -280,10 +448,10 @@ def get_changes_analysis():
     Get changes analysis
     """
     try:
-        days = request.args.get('days', 30, type=int)
+        days = clamp_analysis_days(request.args.get('days', 30, type=int))
         analysis = api.get_changes_analysis(days)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': analysis,
             'days': days
@@ -291,7 +459,7 @@ def get_changes_analysis():
         
     except Exception as e:
         logger.error(f"Error in get_changes_analysis endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -302,12 +470,12 @@ def chat():
         data = request.get_json()
         
         if not data or 'query' not in data:
-            return jsonify({'error': 'Query is required'}), 400
+            return json_response({'error': 'Query is required'}, 400)
         
         query = data['query']
         response = api.process_chat_query(query)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'query': query,
             'response': response,
@@ -316,7 +484,38 @@ def chat():
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Process several chat queries in one request
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('queries'), list) or not data['queries']:
+            return json_response({'error': 'A non-empty list of queries is required'}, 400)
+        
+        if len(data['queries']) > MAX_CHAT_BATCH:
+            return json_response({'error': f'At most {MAX_CHAT_BATCH} queries per batch'}, 400)
+        
+        queries = [str(query) for query in data['queries']]
+        responses = api.process_chat_queries(queries)
+        
+        return json_response({
+            'success': True,
+            'results': [
+                {'query': query, 'response': response}
+                for query, response in zip(queries, responses)
+            ],
+            'count': len(queries),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in chat batch endpoint: {str(e)}")
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.route('/api/companies', methods=['GET'])
 def get_companies():
@@ -349,7 +548,7 @@ def get_companies():
         
         # Get total count
         count_query = f"SELECT COUNT(*) as total FROM companies {where_clause}"
-        total_count = pd.read_sql_query(count_query, conn, params=params).iloc[0]['total']
+        total_count = conn.execute(count_query, params).fetchone()[0]
         
         # Get paginated results
         query = f"""
@@ -360,12 +559,11 @@ def get_companies():
         """
         params.extend([per_page, offset])
         
-        companies_df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
         
-        return jsonify({
+        header = orjson.dumps({
             'success': True,
-            'data': companies_df.to_dict('records'),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -374,23 +572,32 @@ def get_companies():
             }
         })
         
+        def generate():
+            # Stream rows straight from the cursor instead of buffering the whole page
+            yield header[:-1] + b',"data":['
+            for i, row in enumerate(cursor):
+                yield (b',' if i else b'') + orjson.dumps(dict(zip(columns, row)))
+            yield b']}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
+        
     except Exception as e:
         logger.error(f"Error in get_companies endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return json_response({'error': 'Internal server error'}, 500)
 
 @app.errorhandler(404)
 def not_found(error):
     """
     Handle 404 errors
     """
-    return jsonify({'error': 'Endpoint not found'}), 404
+    return json_response({'error': 'Endpoint not found'}, 404)
 
 @app.errorhandler(500)
 def internal_error(error):
     """
     Handle 500 errors
     """
-    return jsonify({'error': 'Internal server error'}), 500
+    return json_response({'error': 'Internal server error'}, 500)
 
 if __name__ == '__main__':
     print("Starting MCA Insights Engine API...")
@@ -401,6 +608,8 @@ if __name__ == '__main__':
     print("- GET /api/dashboard/stats - Get dashboard statistics")
     print("- GET /api/changes/analysis?days=<days> - Get changes analysis")
     print("- POST /api/chat - Process chat query")
+    print("- POST /api/chat/batch - Process several chat queries")
     print("- GET /api/companies?page=<page>&per_page=<per_page>&state=<state>&status=<status> - Get companies")
+    print("For concurrent serving use: gunicorn -c gunicorn.conf.py wsgi:app")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,115 +1,316 @@
 import pandas as pd
 import numpy as np
 import sqlite3
-import json
+import hashlib
+import csv
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import logging
+from data_integration import CANONICAL_STATES, canonical_state, clear_summary_cache, normalize_labels
 
 logger = logging.getLogger(__name__)
 
+# Snapshot pairs diffed in parallel; 1 keeps the sequential, lowest-memory path
+CHANGE_DETECTION_WORKERS = int(os.getenv('CHANGE_DETECTION_WORKERS', '1'))
+
+# Parquet metadata keys recording which CSV a snapshot copy was built from and its content hash
+SNAPSHOT_SOURCE_KEY = b'mca_source_stamp'
+SNAPSHOT_HASH_KEY = b'mca_content_hash'
+
+# Indexes behind the change history lookups and the API's change aggregates
+CHANGE_INDEX_STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS idx_changes_cin_date ON company_changes(CIN, Date)",
+    "CREATE INDEX IF NOT EXISTS idx_changes_date ON company_changes(Date)",
+    "CREATE INDEX IF NOT EXISTS idx_changes_type_state ON company_changes(Change_Type, State)",
+    "CREATE INDEX IF NOT EXISTS idx_changes_day ON company_changes(substr(Date, 1, 10))",
+)
+
 class ChangeDetector:
     """
     Class to detect and log company-level changes across daily snapshots
     """
     
+    # Only the columns detect_changes reads are loaded from a snapshot
+    SNAPSHOT_COLUMNS = {
+        'CIN', 'Company_Name', 'State', 'Status', 'Authorized_Capital', 'Paidup_Capital',
+        'Address', 'Industry_Classification', 'snapshot_date'
+    }
+    
+    # Types fixed up front instead of inferred per file, so every snapshot parses alike
+    SNAPSHOT_COLUMN_TYPES = {
+        'CIN': pa.string(),
+        'Company_Name': pa.string(),
+        'State': pa.string(),
+        'Status': pa.string(),
+        'Authorized_Capital': pa.float64(),
+        'Paidup_Capital': pa.float64(),
+        'Address': pa.string(),
+        'Industry_Classification': pa.string(),
+        'snapshot_date': pa.timestamp('ns')
+    }
+    
+    # Low-cardinality columns are parsed straight into categoricals
+    SNAPSHOT_DTYPES = {'State': 'category', 'Status': 'category'}
+    
+    # Bytes parsed per block by the multithreaded Arrow CSV reader
+    CSV_BLOCK_SIZE = 32 << 20
+    
+    # Fields compared between snapshots for companies present in both
+    FIELDS_TO_CHECK = [
+        'Status', 'Authorized_Capital', 'Paidup_Capital',
+        'Company_Name', 'Address', 'Industry_Classification'
+    ]
+    
+    # Columns of the change log, in output order
+    CHANGE_COLUMNS = [
+        'CIN', 'Change_Type', 'Field_Changed', 'Old_Value', 'New_Value',
+        'Date', 'Company_Name', 'State', 'Status'
+    ]
+    
     def __init__(self, db_path='mca_insights.db'):
         self.db_path = db_path
-        self.change_logs = []
+        self.change_logs = pd.DataFrame(columns=self.CHANGE_COLUMNS)
         
     def load_snapshot(self, snapshot_file):
         """
         Load a daily snapshot CSV file
         """
         try:
-            df = pd.read_csv(snapshot_file)
-            df['snapshot_date'] = pd.to_datetime(df['snapshot_date'])
-            logger.info(f"Loaded snapshot with {len(df)} records")
+            # Reuse the typed Parquet copy written on an earlier load of this exact CSV
+            parquet_file = f'{snapshot_file}.parquet'
+            source = self._source_stamp(snapshot_file)
+            df = self._read_snapshot_parquet(parquet_file, source)
+            
+            if df is None:
+                df = self._read_snapshot_csv(snapshot_file)
+                df['snapshot_date'] = pd.to_datetime(df['snapshot_date'])
+                # Byte-identical snapshot files cannot differ, so their diff can be skipped
+                df.attrs['content_hash'] = self._content_hash(snapshot_file)
+                logger.info(f"Loaded snapshot with {len(df)} records")
+                self._write_snapshot_parquet(df, parquet_file, source)
+            
             return df
         except Exception as e:
             logger.error(f"Error loading snapshot {snapshot_file}: {str(e)}")
             return None
     
+    def _source_stamp(self, snapshot_file):
+        """
+        Size and modification time identifying the CSV a Parquet copy was built from
+        """
+        stat = os.stat(snapshot_file)
+        return f"{stat.st_size}:{stat.st_mtime_ns}".encode()
+    
+    def _read_snapshot_parquet(self, parquet_file, source):
+        """
+        Load the Parquet copy of a snapshot, or None when it is missing, stale or unreadable
+        """
+        if not os.path.exists(parquet_file):
+            return None
+        
+        try:
+            metadata = pq.read_schema(parquet_file).metadata or {}
+            if metadata.get(SNAPSHOT_SOURCE_KEY) != source or SNAPSHOT_HASH_KEY not in metadata:
+                return None
+            
+            df = pd.read_parquet(parquet_file)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot cache {parquet_file}: {str(e)}")
+            return None
+        
+        df.attrs['content_hash'] = metadata[SNAPSHOT_HASH_KEY].decode()
+        logger.info(f"Loaded snapshot with {len(df)} records from {parquet_file}")
+        return df
+    
+    def _write_snapshot_parquet(self, df, parquet_file, source):
+        """
+        Write the Parquet copy of a snapshot, with its source stamp and content hash, atomically
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            SNAPSHOT_SOURCE_KEY: source,
+            SNAPSHOT_HASH_KEY: df.attrs['content_hash'].encode()
+        })
+        
+        # Written to a private temp file and renamed, so a crash or a concurrent
+        # worker never leaves a partial copy under the real name
+        fd, temp_file = tempfile.mkstemp(
+            prefix=f'{os.path.basename(parquet_file)}.', suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(parquet_file))
+        )
+        os.close(fd)
+        try:
+            pq.write_table(table, temp_file)
+            os.replace(temp_file, parquet_file)
+        except Exception as e:
+            logger.warning(f"Could not cache snapshot as {parquet_file}: {str(e)}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    def _read_snapshot_csv(self, snapshot_file):
+        """
+        Parse the needed snapshot columns block by block with the Arrow CSV reader
+        """
+        with open(snapshot_file, newline='', encoding='utf-8-sig') as f:
+            header = next(row for row in csv.reader(f) if row)
+        
+        table = pa_csv.read_csv(
+            snapshot_file,
+            read_options=pa_csv.ReadOptions(block_size=self.CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[column for column in header if column in self.SNAPSHOT_COLUMNS],
+                column_types=self.SNAPSHOT_COLUMN_TYPES,
+                strings_can_be_null=True
+            )
+        )
+        df = table.to_pandas()
+        return df.astype({column: dtype for column, dtype in self.SNAPSHOT_DTYPES.items() if column in df.columns})
+    
+    def _content_hash(self, snapshot_file):
+        """
+        Hash the raw bytes of a snapshot file
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(snapshot_file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
     def detect_changes(self, old_df, new_df, change_date):
         """
-        Detect changes between two snapshots
+        Detect changes between two snapshots, returned as a DataFrame of change records
         """
-        changes = []
+        # Only a real previous snapshot can match; without one every company is new
+        if old_df is None:
+            old_df = pd.DataFrame(columns=new_df.columns)
+        else:
+            content_hash = new_df.attrs.get('content_hash')
+            if content_hash is not None and content_hash == old_df.attrs.get('content_hash'):
+                logger.info("Snapshot content unchanged, skipping diff")
+                return self._concat_changes([])
         
-        # Get CINs from both snapshots
-        old_cins = set(old_df['CIN']) if old_df is not None else set()
-        new_cins = set(new_df['CIN'])
+        # Build each group of change records column-wise rather than one dict per row
+        frames = []
+        
+        # Factorize the CINs of both snapshots into shared integer codes once, so the
+        # partitioning and alignment below work on integer arrays instead of strings
+        codes, uniques = pd.factorize(pd.concat([old_df['CIN'], new_df['CIN']], ignore_index=True))
+        old_codes, new_codes = codes[:len(old_df)], codes[len(old_df):]
+        
+        # Row position of every code in each snapshot, -1 where the CIN is absent
+        old_positions = np.full(len(uniques), -1, dtype=np.intp)
+        old_positions[old_codes] = np.arange(len(old_codes))
+        new_positions = np.full(len(uniques), -1, dtype=np.intp)
+        new_positions[new_codes] = np.arange(len(new_codes))
+        
+        # A CIN repeated within a snapshot would leave its earlier rows unmapped; fail
+        # early like a one-to-one merge rather than diffing against an arbitrary row
+        for name, snapshot_codes, positions in (('old', old_codes, old_positions), ('new', new_codes, new_positions)):
+            if (positions[snapshot_codes] != np.arange(len(snapshot_codes))).any():
+                raise ValueError(f"Duplicate CINs found in the {name} snapshot")
+        
+        in_old = old_positions[new_codes] >= 0
+        in_new = new_positions[old_codes] >= 0
         
         # Detect new incorporations
-        new_incorporations = new_cins - old_cins
-        for cin in new_incorporations:
-            company_data = new_df[new_df['CIN'] == cin].iloc[0]
-            changes.append({
-                'CIN': cin,
-                'Change_Type': 'New Incorporation',
-                'Field_Changed': 'All',
-                'Old_Value': '',
-                'New_Value': company_data['Company_Name'],
-                'Date': change_date,
-                'Company_Name': company_data['Company_Name'],
-                'State': company_data['State'],
-                'Status': company_data['Status']
-            })
+        new_incorporations = new_df[~in_old]
+        frames.append(pd.DataFrame({
+            'CIN': new_incorporations['CIN'].to_numpy(),
+            'Change_Type': 'New Incorporation',
+            'Field_Changed': 'All',
+            'Old_Value': '',
+            'New_Value': new_incorporations['Company_Name'].to_numpy(),
+            'Date': change_date,
+            'Company_Name': new_incorporations['Company_Name'].to_numpy(),
+            'State': new_incorporations['State'].to_numpy(),
+            'Status': new_incorporations['Status'].to_numpy()
+        }))
         
         # Detect deregistrations/strike offs
-        deregistrations = old_cins - new_cins
-        for cin in deregistrations:
-            company_data = old_df[old_df['CIN'] == cin].iloc[0]
-            changes.append({
-                'CIN': cin,
-                'Change_Type': 'Deregistration',
-                'Field_Changed': 'Status',
-                'Old_Value': company_data['Status'],
-                'New_Value': 'Deregistered',
-                'Date': change_date,
-                'Company_Name': company_data['Company_Name'],
-                'State': company_data['State'],
-                'Status': 'Deregistered'
-            })
+        deregistrations = old_df[~in_new]
+        frames.append(pd.DataFrame({
+            'CIN': deregistrations['CIN'].to_numpy(),
+            'Change_Type': 'Deregistration',
+            'Field_Changed': 'Status',
+            'Old_Value': deregistrations['Status'].to_numpy(),
+            'New_Value': 'Deregistered',
+            'Date': change_date,
+            'Company_Name': deregistrations['Company_Name'].to_numpy(),
+            'State': deregistrations['State'].to_numpy(),
+            'Status': 'Deregistered'
+        }))
         
         # Detect field-level changes for existing companies
-        common_cins = old_cins & new_cins
-        for cin in common_cins:
-            old_company = old_df[old_df['CIN'] == cin].iloc[0]
-            new_company = new_df[new_df['CIN'] == cin].iloc[0]
+        # Check for changes in key fields present in both snapshots
+        fields_to_check = [
+            field for field in self.FIELDS_TO_CHECK
+            if field in old_df.columns and field in new_df.columns
+        ]
+        
+        # Align the companies present in both snapshots row by row, carrying only
+        # the compared fields and the columns copied into each change record
+        diff_columns = list(dict.fromkeys([*fields_to_check, 'Company_Name', 'State', 'Status']))
+        new_rows = np.flatnonzero(in_old)
+        old_rows = old_positions[new_codes[new_rows]]
+        old_common = old_df[diff_columns].iloc[old_rows].reset_index(drop=True)
+        new_common = new_df[['CIN', *diff_columns]].iloc[new_rows].reset_index(drop=True)
+        
+        # Compare whole columns at once, one pass per field; missing values compare as ''
+        for field in fields_to_check:
+            old_values = old_common[field]
+            new_values = new_common[field]
+            old_str = old_values.astype(str).where(old_values.notna(), '')
+            new_str = new_values.astype(str).where(new_values.notna(), '')
             
-            # Check for changes in key fields
-            fields_to_check = [
-                'Status', 'Authorized_Capital', 'Paidup_Capital', 
-                'Company_Name', 'Address', 'Industry_Classification'
-            ]
+            # One fused boolean expression, then the changed row positions
+            mask = (old_str != new_str) & (old_str != '') & (new_str != '')
+            changed_rows = np.flatnonzero(mask.to_numpy())
+            if not len(changed_rows):
+                continue
             
-            for field in fields_to_check:
-                if field in old_company and field in new_company:
-                    old_value = str(old_company[field]) if pd.notna(old_company[field]) else ''
-                    new_value = str(new_company[field]) if pd.notna(new_company[field]) else ''
-                    
-                    if old_value != new_value and old_value != '' and new_value != '':
-                        changes.append({
-                            'CIN': cin,
-                            'Change_Type': 'Field Update',
-                            'Field_Changed': field,
-                            'Old_Value': old_value,
-                            'New_Value': new_value,
-                            'Date': change_date,
-                            'Company_Name': new_company['Company_Name'],
-                            'State': new_company['State'],
-                            'Status': new_company['Status']
-                        })
-        
-        return changes
-    
-    def process_daily_changes(self, snapshot_files):
+            changed = new_common.iloc[changed_rows]
+            frames.append(pd.DataFrame({
+                'CIN': changed['CIN'].to_numpy(),
+                'Change_Type': 'Field Update',
+                'Field_Changed': field,
+                'Old_Value': old_str.iloc[changed_rows].to_numpy(),
+                'New_Value': new_str.iloc[changed_rows].to_numpy(),
+                'Date': change_date,
+                'Company_Name': changed['Company_Name'].to_numpy(),
+                'State': changed['State'].to_numpy(),
+                'Status': changed['Status'].to_numpy()
+            }))
+        
+        return self._concat_changes(frames)
+    
+    def _concat_changes(self, frames):
+        """
+        Concatenate change-record frames once, keeping the change log column order
+        """
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=self.CHANGE_COLUMNS)
+        
+        return pd.concat(frames, ignore_index=True)[self.CHANGE_COLUMNS]
+    
+    def process_daily_changes(self, snapshot_files, max_workers=None):
         """
         Process changes across multiple daily snapshots
         """
         logger.info("Starting daily change detection process")
         
-        all_changes = []
+        max_workers = max_workers or CHANGE_DETECTION_WORKERS
+        if max_workers > 1 and len(snapshot_files) > 2:
+            return self._process_pairs_in_parallel(snapshot_files, max_workers)
+        
+        daily_changes = []
         previous_df = None
         
         for i, snapshot_file in enumerate(snapshot_files):
@@ -121,11 +322,34 @@ class ChangeDetector:
                     # Detect changes between previous and current snapshot
                     change_date = current_df['snapshot_date'].iloc[0]
                     changes = self.detect_changes(previous_df, current_df, change_date)
-                    all_changes.extend(changes)
+                    daily_changes.append(changes)
                     logger.info(f"Detected {len(changes)} changes in snapshot {i+1}")
                 
+                # The previous snapshot is released as soon as its diff is done, so at
+                # most two snapshots are alive at any point
                 previous_df = current_df
+                del current_df
+        
+        # Build the combined change log in a single concatenation
+        all_changes = self._concat_changes(daily_changes)
+        self.change_logs = all_changes
+        logger.info(f"Total changes detected: {len(all_changes)}")
         
+        return all_changes
+    
+    def _process_pairs_in_parallel(self, snapshot_files, max_workers):
+        """
+        Diff consecutive snapshot pairs in worker processes
+        """
+        pairs = list(zip(snapshot_files[:-1], snapshot_files[1:]))
+        logger.info(f"Diffing {len(pairs)} snapshot pairs with {max_workers} workers")
+        
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pairs))) as executor:
+            daily_changes = list(executor.map(
+                _diff_pair, [self.db_path] * len(pairs), *zip(*pairs)
+            ))
+        
+        all_changes = self._concat_changes(daily_changes)
         self.change_logs = all_changes
         logger.info(f"Total changes detected: {len(all_changes)}")
         
@@ -135,32 +359,37 @@ class ChangeDetector:
         """
         Save change logs to file
         """
-        if not self.change_logs:
+        if self.change_logs.empty:
             logger.warning("No changes to save")
             return
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         if output_format == 'csv':
-            df = pd.DataFrame(self.change_logs)
             filename = f'change_logs_{timestamp}.csv'
-            df.to_csv(filename, index=False)
+            table = pa.Table.from_pandas(
+                self.change_logs.assign(Date=self.change_logs['Date'].astype(str)),
+                preserve_index=False
+            )
+            pa_csv.write_csv(table, filename, pa_csv.WriteOptions(quoting_style='needed'))
             logger.info(f"Change logs saved to {filename}")
             
         elif output_format == 'json':
             filename = f'change_logs_{timestamp}.json'
-            with open(filename, 'w') as f:
-                json.dump(self.change_logs, f, indent=2, default=str)
+            # Dates are written as text, in the same form as the CSV log
+            records = self.change_logs.assign(Date=self.change_logs['Date'].astype(str)).to_dict('records')
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
             logger.info(f"Change logs saved to {filename}")
     
     def get_change_summary(self):
         """
         Get summary of detected changes
         """
-        if not self.change_logs:
+        if self.change_logs.empty:
             return None
         
-        df = pd.DataFrame(self.change_logs)
+        df = self.change_logs
         
         summary = {
             'total_changes': len(df),
@@ -195,14 +424,36 @@ class ChangeDetector:
                     Company_Name TEXT,
                     State TEXT,
                     Status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    State_Canon TEXT
                 )
             ''')
+            with conn:
+                ensure_state_canon(conn)
+                for statement in CHANGE_INDEX_STATEMENTS:
+                    conn.execute(statement)
             
-            # Insert change logs
-            if self.change_logs:
-                df = pd.DataFrame(self.change_logs)
-                df.to_sql('company_changes', conn, if_exists='append', index=False)
+            # Insert change logs in one transaction; WAL avoids an fsync per insert
+            if not self.change_logs.empty:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                
+                # Canonical state is stored with each row so the dashboard filters on an index
+                rows = self.change_logs.assign(
+                    Date=self.change_logs['Date'].astype(str),
+                    State_Canon=normalize_labels(self.change_logs['State']).replace(CANONICAL_STATES)
+                ).astype(object)
+                rows = rows.where(rows.notna(), None)
+                
+                columns = self.CHANGE_COLUMNS + ['State_Canon']
+                placeholders = ', '.join('?' * len(columns))
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO company_changes ({', '.join(columns)}) VALUES ({placeholders})",
+                        rows.itertuples(index=False, name=None)
+                    )
+                    # The API's change aggregates no longer match the table
+                    clear_summary_cache(conn)
                 logger.info(f"Inserted {len(self.change_logs)} change records into database")
             
             conn.close()
@@ -210,6 +461,32 @@ class ChangeDetector:
         except Exception as e:
             logger.error(f"Error updating master database: {str(e)}")
 
+def ensure_state_canon(conn):
+    """
+    Add and index company_changes.State_Canon, filling it in for rows written without it
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(company_changes)")}
+    if 'State_Canon' not in columns:
+        conn.execute("ALTER TABLE company_changes ADD COLUMN State_Canon TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_state_canon ON company_changes(State_Canon)")
+    
+    # Only pre-existing or seeded rows are NULL, and the index finds them without a scan
+    conn.create_function("canonical_state", 1, canonical_state, deterministic=True)
+    conn.execute("UPDATE company_changes SET State_Canon = canonical_state(COALESCE(State, '')) WHERE State_Canon IS NULL")
+
+def _diff_pair(db_path, old_file, new_file):
+    """
+    Load two snapshots and diff them; runs inside a worker process
+    """
+    detector = ChangeDetector(db_path)
+    old_df = detector.load_snapshot(old_file)
+    new_df = detector.load_snapshot(new_file)
+    
+    if old_df is None or new_df is None:
+        return pd.DataFrame(columns=ChangeDetector.CHANGE_COLUMNS)
+    
+    return detector.detect_changes(old_df, new_df, new_df['snapshot_date'].iloc[0])
+
 if __name__ == "__main__":
     # Initialize change detector
     detector = ChangeDetector()
@@ -218,7 +495,7 @@ if __name__ == "__main__":
     snapshot_files = ['snapshot_day1.csv', 'snapshot_day2.csv', 'snapshot_day3.csv']
     changes = detector.process_daily_changes(snapshot_files)
     
-    if changes:
+    if not changes.empty:
         # Save change logs
         detector.save_change_logs('csv')
         detector.save_change_logs('json')
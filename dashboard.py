@@ -3,12 +3,17 @@ import pandas as pd
 import sqlite3
 import plotly.express as px
 import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from datetime import datetime, timedelta
-import json
+import io
+import orjson
 import logging
+import os
 from ai_features import AISummaryGenerator, ConversationalQueryEngine
 from change_detection import ChangeDetector
 from web_enrichment import WebEnrichment
+from data_integration import canonical_state, normalize_label
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +58,188 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Most points drawn on the changes trend before it is bucketed by week
+MAX_TREND_POINTS = 2000
+
+# Categories drawn individually in count charts; the rest are folded into "Other"
+CHART_TOP_N = 10
+
+# Low-cardinality company columns, loaded as categoricals for cheap value_counts
+COMPANY_CATEGORY_DTYPES = {
+    'State': 'category', 'Status': 'category', 'CompanyCategory': 'category', 'CompanyClass': 'category'
+}
+
+# Company columns read by the search page and its detail view
+SEARCH_COLUMNS = (
+    'CIN', 'CompanyName', 'State', 'Status', 'AuthorizedCapital', 'PaidupCapital',
+    'Registration_Date', 'CompanyIndustrialClassification'
+)
+
+# Change log columns shown on the change pages; the row id and insert time stay in SQLite
+CHANGE_COLUMNS = (
+    'CIN', 'Change_Type', 'Field_Changed', 'Old_Value', 'New_Value', 'Date', 'Company_Name', 'State', 'Status'
+)
+
+def _connect_readonly(db_path, check_same_thread=True):
+    """
+    Open a tuned read-only connection
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    # Wait for a writer rebuilding the database instead of failing immediately
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+@st.cache_data(show_spinner=False)
+def _load_filter_options(db_path, db_mtime):
+    """
+    Distinct states and statuses for the sidebar filters
+    """
+    conn = _connect_readonly(db_path)
+    try:
+        states = conn.execute("SELECT DISTINCT State FROM companies WHERE State IS NOT NULL").fetchall()
+        statuses = conn.execute("SELECT DISTINCT Status FROM companies WHERE Status IS NOT NULL").fetchall()
+    finally:
+        conn.close()
+    
+    return (
+        sorted({str(state).strip() for (state,) in states}),
+        sorted({str(status).strip() for (status,) in statuses})
+    )
+
+def _company_filters(state_canon=None, status_norm=None):
+    """
+    SQL conditions and parameters for the normalized state and status filters
+    """
+    filters, params = [], []
+    if state_canon is not None:
+        filters.append("State_Canon = ?")
+        params.append(state_canon)
+    if status_norm is not None:
+        filters.append("Status_Norm = ?")
+        params.append(status_norm)
+    return filters, params
+
+@st.cache_data(show_spinner=False)
+def _search_companies(db_path, db_mtime, column, search_term, state_canon=None, status_norm=None):
+    """
+    Case-insensitive substring search on CIN or CompanyName within the sidebar filters
+    """
+    filters, params = _company_filters(state_canon, status_norm)
+    columns = ', '.join(f"c.{col}" for col in SEARCH_COLUMNS)
+    
+    # The trigram index needs at least three characters; shorter terms use a LIKE scan
+    if len(search_term) >= 3:
+        phrase = search_term.replace('"', '""')
+        filters.insert(0, "companies_fts MATCH ?")
+        params.insert(0, f'{column} : "{phrase}"')
+        query = f"""
+            SELECT {columns} FROM companies_fts
+            JOIN companies c ON c.rowid = companies_fts.rowid
+            WHERE {' AND '.join(filters)}
+            ORDER BY bm25(companies_fts)
+        """
+    else:
+        pattern = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        filters.insert(0, f"c.{column} LIKE ? ESCAPE '\\'")
+        params.insert(0, f"%{pattern}%")
+        query = f"SELECT {columns} FROM companies c WHERE {' AND '.join(filters)}"
+    
+    conn = _connect_readonly(db_path)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+@st.cache_data(show_spinner=False)
+def _load_changes(db_path, db_mtime, columns, state_canon=None):
+    """
+    Read only the requested change columns for the selected state
+    """
+    query = f"SELECT {', '.join(columns)} FROM company_changes"
+    params = []
+    if state_canon is not None:
+        query += " WHERE State_Canon = ?"
+        params.append(state_canon)
+    
+    conn = _connect_readonly(db_path)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+@st.cache_data(show_spinner=False)
+def _load_company_stats(db_path, db_mtime, state_canon=None, status_norm=None):
+    """
+    Pre-aggregated company counts for the overview, filtered like the company rows
+    """
+    filters, params = _company_filters(state_canon, status_norm)
+    query = "SELECT State, Status, Company_Count, Capital_Count, Capital_Total FROM companies_by_state_status"
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    
+    conn = _connect_readonly(db_path)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+def _sum_counts(company_stats, column):
+    """
+    Company counts per value of a column, largest first like value_counts
+    """
+    return company_stats.groupby(column)['Company_Count'].sum().sort_values(ascending=False, kind='stable')
+
+@st.cache_data(show_spinner=False)
+def _counts_figure(chart_type, label, counts, title):
+    """
+    Build a pie or bar chart from (label, count) pairs, reused while the counts are unchanged
+    """
+    counts = list(counts)
+    if len(counts) > CHART_TOP_N:
+        # Keep the largest categories and fold the long tail into a single "Other" slice
+        counts = sorted(counts, key=lambda item: item[1], reverse=True)
+        counts = counts[:CHART_TOP_N] + [("Other", sum(count for _, count in counts[CHART_TOP_N:]))]
+    counts_df = pd.DataFrame(counts, columns=[label, "Count"])
+    if chart_type == "pie":
+        return px.pie(data_frame=counts_df, values="Count", names=label, title=title)
+    return px.bar(data_frame=counts_df, x=label, y="Count", title=title)
+
+@st.cache_data(show_spinner=False)
+def _generate_summary(_ai_summary_gen, changes_df):
+    """
+    Daily summary for a set of changes, shared by the summary and export buttons
+    """
+    return _ai_summary_gen.generate_daily_summary(changes_df)
+
+def _changes_csv_bytes(changes_df):
+    """
+    Encode the changes table as CSV bytes with the batched Arrow writer
+    """
+    # Timestamps keep the text form pandas would have written
+    export_df = changes_df.assign(**{
+        col: changes_df[col].astype(str).where(changes_df[col].notna())
+        for col in changes_df.columns if pd.api.types.is_datetime64_any_dtype(changes_df[col])
+    })
+    buffer = io.BytesIO()
+    pa_csv.write_csv(
+        pa.Table.from_pandas(export_df, preserve_index=False), buffer,
+        write_options=pa_csv.WriteOptions(batch_size=50000, quoting_style='needed')
+    )
+    return buffer.getvalue()
+
+def _db_mtime(db_path):
+    """
+    Latest modification time of the database, including its WAL file
+    """
+    wal_path = f"{db_path}-wal"
+    mtimes = [os.path.getmtime(db_path)]
+    if os.path.exists(wal_path):
+        mtimes.append(os.path.getmtime(wal_path))
+    return max(mtimes)
+
 class MCADashboard:
     """
     Main dashboard class for MCA Insights Engine
@@ -63,26 +250,59 @@ class MCADashboard:
         self.ai_summary_gen = AISummaryGenerator()
         self.query_engine = ConversationalQueryEngine(self.db_path)
         
-    def load_data(self):
+    def load_filter_options(self):
         """
-        Load data from database
+        Load the state and status filter options from database
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Load companies data
-            companies_df = pd.read_sql_query("SELECT * FROM companies", conn)
+            return _load_filter_options(self.db_path, _db_mtime(self.db_path))
             
-            # Load changes data
-            changes_df = pd.read_sql_query("SELECT * FROM company_changes", conn)
+        except Exception as e:
+            logger.error(f"Error loading filter options: {str(e)}")
+            return None, None
+    
+    def search_companies(self, column, search_term, state_canon=None, status_norm=None):
+        """
+        Search companies through the full-text index, filtered by normalized state and status
+        """
+        try:
+            # Cached across reruns until the database file changes
+            return _search_companies(self.db_path, _db_mtime(self.db_path), column, search_term, state_canon, status_norm)
             
-            conn.close()
+        except Exception as e:
+            logger.error(f"Error searching companies: {str(e)}")
+            return None
+    
+    def load_changes(self, columns, state_canon=None):
+        """
+        Load the given change log columns from database, filtered by normalized state
+        """
+        try:
+            return _load_changes(self.db_path, _db_mtime(self.db_path), tuple(columns), state_canon)
             
-            return companies_df, changes_df
+        except Exception as e:
+            logger.error(f"Error loading changes: {str(e)}")
+            return None
+    
+    def load_company_stats(self, state_canon=None, status_norm=None):
+        """
+        Load the pre-aggregated company counts for the overview
+        """
+        try:
+            return _load_company_stats(self.db_path, _db_mtime(self.db_path), state_canon, status_norm)
             
         except Exception as e:
-            logger.error(f"Error loading data: {str(e)}")
-            return None, None
+            logger.error(f"Error loading company stats: {str(e)}")
+            return None
+    
+    def get_chat_connection(self):
+        """
+        Read-only connection kept for the whole session, so chat queries reuse its page and statement caches
+        """
+        # Streamlit may serve a session's reruns from different threads
+        if "db_conn" not in st.session_state:
+            st.session_state.db_conn = _connect_readonly(self.db_path, check_same_thread=False)
+        return st.session_state.db_conn
     
     def render_header(self):
         """
@@ -91,7 +311,7 @@ class MCADashboard:
         st.markdown('<h1 class="main-header">🏢 MCA Insights Engine</h1>', unsafe_allow_html=True)
         st.markdown("---")
     
-    def render_sidebar(self, companies_df: pd.DataFrame):
+    def render_sidebar(self, state_options, status_options):
         """
         Render the sidebar with filters and navigation
         """
@@ -107,18 +327,10 @@ class MCADashboard:
         st.sidebar.markdown("### Filters")
         
         # State filter (dynamic from data)
-        try:
-            state_options = sorted({str(s).strip() for s in companies_df['State'].dropna().unique()})
-        except Exception:
-            state_options = []
         states = ['All'] + state_options
         selected_state = st.sidebar.selectbox("State", states, index=states.index('Tamil Nadu') if 'Tamil Nadu' in states else 0)
         
         # Status filter (dynamic from data)
-        try:
-            status_options = sorted({str(s).strip() for s in companies_df['Status'].dropna().unique()})
-        except Exception:
-            status_options = []
         statuses = ['All'] + status_options
         selected_status = st.sidebar.selectbox("Company Status", statuses)
         
@@ -132,38 +344,44 @@ class MCADashboard:
         
         return page, selected_state, selected_status, date_range
     
-    def render_dashboard_overview(self, companies_df, changes_df):
+    def render_dashboard_overview(self, company_stats, changes_df):
         """
         Render the main dashboard overview
         """
         st.header("📊 Dashboard Overview")
         
+        # Count every change type in one pass for the metric deltas
+        change_type_counts = changes_df['Change_Type'].value_counts()
+        total_companies = int(company_stats['Company_Count'].sum())
+        active_companies = int(company_stats.loc[company_stats['Status'] == 'Active', 'Company_Count'].sum())
+        
         # Key metrics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             st.metric(
                 label="Total Companies",
-                value=f"{len(companies_df):,}",
-                delta=f"+{len(changes_df[changes_df['Change_Type'] == 'New Incorporation'])} new"
+                value=f"{total_companies:,}",
+                delta=f"+{change_type_counts.get('New Incorporation', 0)} new"
             )
         
         with col2:
             st.metric(
                 label="Active Companies",
-                value=f"{len(companies_df[companies_df['Status'] == 'Active']):,}",
-                delta=f"-{len(changes_df[changes_df['Change_Type'] == 'Deregistration'])} deregistered"
+                value=f"{active_companies:,}",
+                delta=f"-{change_type_counts.get('Deregistration', 0)} deregistered"
             )
         
         with col3:
             st.metric(
                 label="Total Changes",
                 value=f"{len(changes_df):,}",
-                delta=f"{len(changes_df[changes_df['Change_Type'] == 'Field Update'])} field updates"
+                delta=f"{change_type_counts.get('Field Update', 0)} field updates"
             )
         
         with col4:
-            avg_capital = companies_df['AuthorizedCapital'].mean() if not companies_df.empty else 0
+            capital_count = company_stats['Capital_Count'].sum()
+            avg_capital = company_stats['Capital_Total'].sum() / capital_count if capital_count else 0
             try:
                 formatted_cap = f"₹{avg_capital:,.0f}" if pd.notna(avg_capital) else "₹0"
             except Exception:
@@ -179,35 +397,21 @@ class MCADashboard:
         
         with col1:
             st.subheader("📈 Companies by State")
-            state_counts = companies_df['State'].value_counts()
+            state_counts = _sum_counts(company_stats, 'State')
             if state_counts.empty:
                 st.info("No companies available for the selected filters.")
             else:
-                state_df = state_counts.reset_index()
-                state_df.columns = ["State", "Count"]
-                fig = px.pie(
-                    data_frame=state_df,
-                    values="Count",
-                    names="State",
-                    title="Company Distribution by State"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                fig = _counts_figure("pie", "State", tuple(state_counts.items()), "Company Distribution by State")
+                st.plotly_chart(fig, use_container_width=True, key="overview_state_pie")
         
         with col2:
             st.subheader("📊 Status Distribution")
-            status_counts = companies_df['Status'].value_counts()
+            status_counts = _sum_counts(company_stats, 'Status')
             if status_counts.empty:
                 st.info("No status data available for the selected filters.")
             else:
-                status_df = status_counts.reset_index()
-                status_df.columns = ["Status", "Count"]
-                fig = px.bar(
-                    data_frame=status_df,
-                    x="Status",
-                    y="Count",
-                    title="Company Status Distribution"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                fig = _counts_figure("bar", "Status", tuple(status_counts.items()), "Company Status Distribution")
+                st.plotly_chart(fig, use_container_width=True, key="overview_status_bar")
         
         # Recent changes
         st.subheader("🔄 Recent Changes")
@@ -217,7 +421,7 @@ class MCADashboard:
         else:
             st.info("No recent changes found.")
     
-    def render_company_search(self, companies_df):
+    def render_company_search(self, state_canon=None, status_norm=None):
         """
         Render the company search page
         """
@@ -233,12 +437,12 @@ class MCADashboard:
         
         if st.button("🔍 Search"):
             if search_term:
-                if search_type == "CIN":
-                    results = companies_df[companies_df['CIN'].str.contains(search_term, case=False, na=False)]
-                else:
-                    results = companies_df[companies_df['CompanyName'].str.contains(search_term, case=False, na=False)]
+                search_column = 'CIN' if search_type == "CIN" else 'CompanyName'
+                results = self.search_companies(search_column, search_term, state_canon, status_norm)
                 
-                if not results.empty:
+                if results is None:
+                    st.error("Search failed. Please ensure the database has been rebuilt with the search index.")
+                elif not results.empty:
                     st.success(f"Found {len(results)} companies")
                     st.dataframe(results, use_container_width=True)
                     
@@ -284,26 +488,30 @@ class MCADashboard:
         with col1:
             st.subheader("📊 Change Types")
             change_counts = changes_df['Change_Type'].value_counts()
-            fig = px.pie(
-                values=change_counts.values,
-                names=change_counts.index,
-                title="Distribution of Change Types"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            fig = _counts_figure("pie", "Change_Type", tuple(change_counts.items()), "Distribution of Change Types")
+            st.plotly_chart(fig, use_container_width=True, key="analysis_change_type_pie")
         
         with col2:
             st.subheader("📅 Changes Over Time")
-            changes_df['Date'] = pd.to_datetime(changes_df['Date'])
-            daily_changes = changes_df.groupby(changes_df['Date'].dt.date).size().reset_index()
-            daily_changes.columns = ['Date', 'Count']
+            # Bin on datetime64 values directly rather than grouping Python date objects
+            dates = pd.to_datetime(changes_df['Date'], errors='coerce', format='ISO8601').dropna()
+            daily_changes = dates.dt.floor('D').value_counts().sort_index().rename_axis('Date').reset_index(name='Count')
+            trend_title = "Daily Changes Trend"
+            
+            # Long histories are bucketed by week so the browser draws a bounded number of points
+            if len(daily_changes) > MAX_TREND_POINTS:
+                weeks = dates.dt.to_period('W').dt.start_time
+                daily_changes = weeks.value_counts().sort_index().rename_axis('Date').reset_index(name='Count')
+                trend_title = "Weekly Changes Trend"
             
             fig = px.line(
                 daily_changes,
                 x='Date',
                 y='Count',
-                title="Daily Changes Trend"
+                title=trend_title,
+                render_mode='webgl'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True, key="analysis_daily_trend")
         
         # State-wise changes
         st.subheader("🗺️ Changes by State")
@@ -311,15 +519,8 @@ class MCADashboard:
         if state_changes.empty:
             st.info("No changes available for the selected filters.")
         else:
-            state_changes_df = state_changes.reset_index()
-            state_changes_df.columns = ["State", "Count"]
-            fig = px.bar(
-                data_frame=state_changes_df,
-                x="State",
-                y="Count",
-                title="Changes by State"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            fig = _counts_figure("bar", "State", tuple(state_changes.items()), "Changes by State")
+            st.plotly_chart(fig, use_container_width=True, key="analysis_state_bar")
         
         # Detailed changes table
         st.subheader("📋 Detailed Changes")
@@ -351,9 +552,7 @@ class MCADashboard:
             # Generate response
             with st.chat_message("assistant"):
                 try:
-                    conn = sqlite3.connect(self.db_path)
-                    response = self.query_engine.process_query(prompt, conn)
-                    conn.close()
+                    response = self.query_engine.process_query(prompt, self.get_chat_connection())
                     
                     st.markdown(response)
                     st.session_state.messages.append({"role": "assistant", "content": response})
@@ -375,7 +574,7 @@ class MCADashboard:
         if st.button("Generate AI Summary"):
             if not changes_df.empty:
                 with st.spinner("Generating AI summary..."):
-                    summary = self.ai_summary_gen.generate_daily_summary(changes_df)
+                    summary = _generate_summary(self.ai_summary_gen, changes_df)
                     
                     st.success("Summary generated successfully!")
                     st.markdown("### 📄 Daily Summary Report")
@@ -396,10 +595,9 @@ class MCADashboard:
         with col1:
             if st.button("Export Changes CSV"):
                 if not changes_df.empty:
-                    csv = changes_df.to_csv(index=False)
                     st.download_button(
                         label="Download Changes CSV",
-                        data=csv,
+                        data=_changes_csv_bytes(changes_df),
                         file_name=f"mca_changes_{datetime.now().strftime('%Y%m%d')}.csv",
                         mime="text/csv"
                     )
@@ -409,8 +607,8 @@ class MCADashboard:
         with col2:
             if st.button("Export Summary JSON"):
                 if not changes_df.empty:
-                    summary = self.ai_summary_gen.generate_daily_summary(changes_df)
-                    json_data = json.dumps(summary, indent=2, default=str)
+                    summary = _generate_summary(self.ai_summary_gen, changes_df)
+                    json_data = orjson.dumps(summary, default=str, option=orjson.OPT_INDENT_2)
                     st.download_button(
                         label="Download Summary JSON",
                         data=json_data,
@@ -426,101 +624,41 @@ class MCADashboard:
         """
         self.render_header()
         
-        # Load data
-        companies_df, changes_df = self.load_data()
+        # Load filter options
+        state_options, status_options = self.load_filter_options()
         
-        if companies_df is None:
+        if state_options is None:
             st.error("Failed to load data. Please ensure the database exists and contains data.")
             return
         
         # Render sidebar and get filters
-        page, selected_state, selected_status, date_range = self.render_sidebar(companies_df)
-        
-        # Apply filters
-        def _norm(s: pd.Series) -> pd.Series:
-            # Lowercase, remove all non-alphanumeric characters so variants match
-            return (
-                s.fillna("")
-                 .astype(str)
-                 .str.casefold()
-                 .str.replace(r"[^a-z0-9]", "", regex=True)
-            )
-
-        def _norm_one(text: str) -> str:
-            return (
-                str(text)
-                .casefold()
-                .encode('ascii', 'ignore')
-                .decode('ascii')
-                .replace(" ", "")
-                .replace("-", "")
-                .replace("_", "")
-                .replace(".", "")
-            )
-
-        if selected_state != 'All':
-            sel_state_norm = _norm_one(selected_state)
-            # Common aliases mapping
-            aliases = {
-                "tamilnadu": {"tamilnadu", "tamilnadoo", "tn"},
-                "andhrapradesh": {"andhrapradesh", "ap"},
-                "uttarpradesh": {"uttarpradesh", "up"},
-                "madhyapradesh": {"madhyapradesh", "mp"},
-            }
-            alias_set = None
-            for key, vals in aliases.items():
-                if sel_state_norm in vals:
-                    alias_set = vals
-                    break
-            # Exact match first
-            norm_state_series = _norm(companies_df['State'])
-            match_mask = norm_state_series == sel_state_norm
-            # Fallback: alias set or bi-directional contains
-            if not match_mask.any():
-                contains_mask = norm_state_series.str.contains(sel_state_norm, na=False) | sel_state_norm.__contains__("")
-                match_mask = contains_mask
-            if alias_set is not None and not match_mask.any():
-                alias_mask = norm_state_series.isin(list(alias_set))
-                match_mask = alias_mask
-            filtered_companies = companies_df[match_mask]
-            # Fallback: contains match if exact yields zero
-            if filtered_companies.empty:
-                filtered_companies = companies_df[norm_state_series.str.contains(sel_state_norm, na=False)]
-            companies_df = filtered_companies
-            if not changes_df.empty and 'State' in changes_df.columns:
-                norm_changes_series = _norm(changes_df['State'])
-                ch_mask = norm_changes_series == sel_state_norm
-                if not ch_mask.any():
-                    ch_mask = norm_changes_series.str.contains(sel_state_norm, na=False)
-                if alias_set is not None and not ch_mask.any():
-                    ch_mask = norm_changes_series.isin(list(alias_set))
-                filtered_changes = changes_df[ch_mask]
-                if filtered_changes.empty:
-                    filtered_changes = changes_df[norm_changes_series.str.contains(sel_state_norm, na=False)]
-                changes_df = filtered_changes
-        
-        if selected_status != 'All':
-            sel_status_norm = (
-                str(selected_status)
-                .casefold()
-                .replace(" ", "")
-                .replace("-", "")
-                .replace("_", "")
-                .replace(".", "")
-            )
-            companies_df = companies_df[_norm(companies_df['Status']) == sel_status_norm]
+        page, selected_state, selected_status, date_range = self.render_sidebar(state_options, status_options)
+        
+        # Translate the filters into normalized values matched inside SQL
+        state_canon = canonical_state(selected_state) if selected_state != 'All' else None
+        status_norm = normalize_label(selected_status) if selected_status != 'All' else None
+        
+        # Load data; company rows are only read by the page that lists them
+        company_stats = self.load_company_stats(state_canon, status_norm)
+        changes_df = self.load_changes(CHANGE_COLUMNS, state_canon)
+        
+        if company_stats is None or changes_df is None:
+            st.error("Failed to load data. Please ensure the database exists and contains data.")
+            return
+        
+        company_count = int(company_stats['Company_Count'].sum())
 
         # Sidebar quick debug counts (non-intrusive) to validate filters
         with st.sidebar.expander("Data Snapshot", expanded=False):
             try:
                 st.caption(
-                    f"Companies after filters: {len(companies_df):,} | Changes: {len(changes_df):,}"
+                    f"Companies after filters: {company_count:,} | Changes: {len(changes_df):,}"
                 )
             except Exception:
                 pass
         
-        # If companies_df becomes empty after filters, show a friendly note
-        if companies_df.empty:
+        # If no companies remain after filters, show a friendly note
+        if company_count == 0:
             st.info("No companies match the selected filters. Try changing State/Status or the date range.")
         
         # Apply date range to changes_df if available
@@ -535,9 +673,9 @@ class MCADashboard:
             pass
         # Render selected page
         if page == "📊 Dashboard Overview":
-            self.render_dashboard_overview(companies_df, changes_df)
+            self.render_dashboard_overview(company_stats, changes_df)
         elif page == "🔍 Company Search":
-            self.render_company_search(companies_df)
+            self.render_company_search(state_canon, status_norm)
         elif page == "📈 Change Analysis":
             self.render_change_analysis(changes_df)
         elif page == "🤖 AI Chat":
@@ -2,18 +2,139 @@ import pandas as pd
 import numpy as np
 import sqlite3
 import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from types import MappingProxyType
 import logging
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Everything except lowercase letters and digits is dropped when normalizing labels
+NON_ALNUM_PATTERN = r"[^a-z0-9]"
+
+def normalize_label(text):
+    """
+    Normalize a state/status label so spelling variants compare equal
+    """
+    return re.sub(NON_ALNUM_PATTERN, "", str(text).casefold())
+
+def normalize_labels(series):
+    """
+    Vectorized normalize_label over a column
+    """
+    return series.fillna("").astype(str).str.casefold().str.replace(NON_ALNUM_PATTERN, "", regex=True)
+
+# Normalized spellings that refer to the same state, keyed by the canonical form;
+# both maps are built once at import and are read-only
+STATE_ALIASES = MappingProxyType({
+    "tamilnadu": frozenset({"tamilnadu", "tamilnadoo", "tn"}),
+    "andhrapradesh": frozenset({"andhrapradesh", "ap"}),
+    "uttarpradesh": frozenset({"uttarpradesh", "up"}),
+    "madhyapradesh": frozenset({"madhyapradesh", "mp"}),
+})
+CANONICAL_STATES = MappingProxyType(
+    {alias: canonical for canonical, aliases in STATE_ALIASES.items() for alias in aliases}
+)
+
+def canonical_state(text):
+    """
+    Normalize a state label and resolve known aliases to one canonical form
+    """
+    state_norm = normalize_label(text)
+    return CANONICAL_STATES.get(state_norm, state_norm)
+
+# Company counts per state/status pair, rebuilt with the companies table so the
+# dashboard overview can read a few hundred rows instead of scanning every company
+COMPANY_STATS_SQL = """
+    SELECT State, Status, State_Canon, Status_Norm,
+           COUNT(*) AS Company_Count,
+           COUNT(AuthorizedCapital) AS Capital_Count,
+           SUM(AuthorizedCapital) AS Capital_Total
+    FROM companies
+    GROUP BY State, Status, State_Canon, Status_Norm
+"""
+
+# Precomputed API aggregates; writers that change the tables they summarize clear it
+SUMMARY_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        name TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        refreshed_at TIMESTAMP NOT NULL
+    )
+"""
+
+def clear_summary_cache(conn):
+    """
+    Drop the cached API aggregates once the tables they summarize have changed
+    """
+    conn.execute(SUMMARY_CACHE_SQL)
+    conn.execute("DELETE FROM summary_cache")
+
+# Trigram full-text index over CIN and CompanyName for substring search; the
+# triggers keep it in step with later edits to the companies table
+COMPANY_SEARCH_INDEX_SQL = (
+    "DROP TABLE IF EXISTS companies_fts",
+    """CREATE VIRTUAL TABLE companies_fts USING fts5(
+        CIN, CompanyName, content='companies', content_rowid='rowid', tokenize='trigram'
+    )""",
+    "INSERT INTO companies_fts(companies_fts) VALUES ('rebuild')",
+    """CREATE TRIGGER IF NOT EXISTS companies_fts_ai AFTER INSERT ON companies BEGIN
+        INSERT INTO companies_fts(rowid, CIN, CompanyName) VALUES (new.rowid, new.CIN, new.CompanyName);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS companies_fts_ad AFTER DELETE ON companies BEGIN
+        INSERT INTO companies_fts(companies_fts, rowid, CIN, CompanyName)
+        VALUES ('delete', old.rowid, old.CIN, old.CompanyName);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS companies_fts_au AFTER UPDATE ON companies BEGIN
+        INSERT INTO companies_fts(companies_fts, rowid, CIN, CompanyName)
+        VALUES ('delete', old.rowid, old.CIN, old.CompanyName);
+        INSERT INTO companies_fts(rowid, CIN, CompanyName) VALUES (new.rowid, new.CIN, new.CompanyName);
+    END""",
+)
+
+def _open_conn(db_path):
+    """
+    Open a SQLite connection tuned for bulk writes alongside concurrent readers
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def _sqlite_type(dtype):
+    """
+    SQLite column type for a pandas dtype, matching what DataFrame.to_sql declares
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
 class MCADataIntegrator:
     """
     Class to handle data integration and consolidation of MCA state-wise CSV files
     """
     
+    # Low-cardinality columns kept as categoricals in the master dataset
+    CATEGORICAL_COLUMNS = ['State', 'Status', 'CompanyCategory', 'CompanyClass']
+    
+    # Raw columns kept as text when parsing; the Arrow reader would otherwise infer dates
+    TEXT_COLUMNS = {'CompanyRegistrationdate_date': pa.string()}
+    
+    # Bumped whenever create_database changes what it builds, so older databases are rebuilt
+    BUILD_VERSION = 1
+    
     def __init__(self, data_dir="."):
         self.data_dir = data_dir
         self.state_files = {
@@ -25,6 +146,7 @@ class MCADataIntegrator:
         }
         self.master_data = None
         self.db_path = 'mca_insights.db'
+        self.source_signature = None
         
     def load_state_data(self, state_name, file_path):
         """
@@ -32,7 +154,14 @@ class MCADataIntegrator:
         """
         try:
             logger.info(f"Loading data for {state_name}")
-            df = pd.read_csv(file_path)
+            table = pa_csv.read_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(block_size=16 << 20, use_threads=True),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=self.TEXT_COLUMNS, strings_can_be_null=True
+                )
+            )
+            df = table.to_pandas()
             
             # Standardize column names
             df.columns = df.columns.str.strip()
@@ -80,6 +209,18 @@ class MCADataIntegrator:
         if 'CompanyStatus' in df.columns:
             df['Status'] = df['CompanyStatus']
         
+        # Normalized filter columns, computed once at ingest instead of on every dashboard rerun
+        if 'State' in df.columns:
+            df['State_Norm'] = normalize_labels(df['State']).astype('category')
+            df['State_Canon'] = df['State_Norm'].astype(str).replace(CANONICAL_STATES).astype('category')
+        if 'Status' in df.columns:
+            df['Status_Norm'] = normalize_labels(df['Status']).astype('category')
+        
+        # Arrow-backed strings so filtering and normalization run in Arrow compute kernels
+        for col in ['CIN', 'CompanyName', 'State', 'Status']:
+            if col in df.columns:
+                df[col] = df[col].astype('string[pyarrow]')
+        
         return df
     
     def consolidate_data(self):
@@ -87,59 +228,155 @@ class MCADataIntegrator:
         Consolidate all state-wise data into a master dataset
         """
         logger.info("Starting data consolidation process")
-        consolidated_data = []
+        # Taken before reading, so a CSV edited mid-run is picked up next time
+        self.source_signature = self._source_signature()
+        state_paths = []
         
         for state_name, file_path in self.state_files.items():
             full_path = os.path.join(self.data_dir, file_path)
             if os.path.exists(full_path):
-                state_data = self.load_state_data(state_name, full_path)
-                if state_data is not None:
-                    consolidated_data.append(state_data)
+                state_paths.append((state_name, full_path))
             else:
                 logger.warning(f"File not found: {full_path}")
         
+        # The Arrow CSV reader releases the GIL, so states load concurrently on threads;
+        # map keeps the configured state order, which decides the duplicates kept below
+        with ThreadPoolExecutor(max_workers=max(1, min(len(state_paths), os.cpu_count() or 1))) as executor:
+            loaded = executor.map(lambda args: self.load_state_data(*args), state_paths)
+            consolidated_data = [state_data for state_data in loaded if state_data is not None]
+        
         if consolidated_data:
             self.master_data = pd.concat(consolidated_data, ignore_index=True)
             
             # Remove duplicates based on CIN
             initial_count = len(self.master_data)
-            self.master_data = self.master_data.drop_duplicates(subset=['CIN'], keep='first')
+            # CIN is Arrow-backed (see _clean_dataframe), so this hashes one column of Arrow strings
+            self.master_data = self.master_data[~self.master_data['CIN'].duplicated(keep='first')]
             final_count = len(self.master_data)
             
             logger.info(f"Consolidated data: {initial_count} -> {final_count} records after deduplication")
             
-            # Save consolidated data
-            self.master_data.to_csv('consolidated_mca_data.csv', index=False)
-            logger.info("Consolidated data saved to consolidated_mca_data.csv")
+            # Categories are set after concatenation, where every state's values are known
+            for col in self.CATEGORICAL_COLUMNS:
+                if col in self.master_data.columns:
+                    self.master_data[col] = self.master_data[col].astype('category')
+            
+            # Save consolidated data as typed, compressed Parquet (categoricals are preserved)
+            self.master_data.to_parquet(
+                'consolidated_mca_data.parquet', engine='pyarrow', compression='zstd',
+                row_group_size=50000, index=False
+            )
+            logger.info("Consolidated data saved to consolidated_mca_data.parquet")
             
             return self.master_data
         else:
             logger.error("No data could be loaded")
             return None
     
+    def _manifest_path(self):
+        """
+        Sidecar file recording which state CSVs the database was built from
+        """
+        db_dir, db_name = os.path.split(self.db_path)
+        return os.path.join(db_dir, f".{db_name}.manifest.json")
+    
+    def _source_signature(self):
+        """
+        Size and modification time of every state CSV, plus the build version
+        """
+        sources = {}
+        for file_path in self.state_files.values():
+            full_path = os.path.join(self.data_dir, file_path)
+            if os.path.exists(full_path):
+                stat = os.stat(full_path)
+                sources[file_path] = [stat.st_size, stat.st_mtime_ns]
+        
+        return {'build_version': self.BUILD_VERSION, 'sources': sources}
+    
+    def is_database_current(self):
+        """
+        Check whether the database was built from the state CSVs as they are now
+        """
+        if not os.path.exists(self.db_path):
+            return False
+        
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        return manifest == self._source_signature()
+    
     def create_database(self):
         """
         Create SQLite database and store consolidated data
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            # A rebuild that fails part way must not look current afterwards
+            if os.path.exists(self._manifest_path()):
+                os.remove(self._manifest_path())
             
-            if self.master_data is not None:
-                self.master_data.to_sql('companies', conn, if_exists='replace', index=False)
-                logger.info(f"Database created with {len(self.master_data)} records")
+            conn = _open_conn(self.db_path)
             
-            # Create indexes for better query performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_cin ON companies(CIN)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_state ON companies(State)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON companies(Status)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_registration_date ON companies(Registration_Date)")
+            # Replace the table, load the rows and build the indexes in one write transaction
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                if self.master_data is not None:
+                    self._write_companies_table(conn, self.master_data)
+                    logger.info(f"Database created with {len(self.master_data)} records")
+                
+                # Create indexes for better query performance
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_cin ON companies(CIN)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_state ON companies(State)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON companies(Status)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_state_canon ON companies(State_Canon)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_status_norm ON companies(Status_Norm)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_registration_date ON companies(Registration_Date)")
+                
+                # Summary table for the dashboard overview
+                conn.execute("DROP TABLE IF EXISTS companies_by_state_status")
+                conn.execute(f"CREATE TABLE companies_by_state_status AS {COMPANY_STATS_SQL}")
+                
+                # Full-text index for company search, filled after the bulk insert
+                for statement in COMPANY_SEARCH_INDEX_SQL:
+                    conn.execute(statement)
+                
+                # Aggregates computed from the previous companies table are stale now
+                clear_summary_cache(conn)
             
             conn.close()
             logger.info("Database indexes created successfully")
             
+            if self.master_data is not None and self.source_signature is not None:
+                with open(self._manifest_path(), 'w', encoding='utf-8') as f:
+                    json.dump(self.source_signature, f)
+            
         except Exception as e:
             logger.error(f"Error creating database: {str(e)}")
     
+    def _write_companies_table(self, conn, df):
+        """
+        Recreate the companies table and bulk insert the dataframe with executemany
+        """
+        columns = ', '.join(f'"{col}" {_sqlite_type(dtype)}' for col, dtype in df.dtypes.items())
+        conn.execute('DROP TABLE IF EXISTS companies')
+        conn.execute(f'CREATE TABLE companies ({columns})')
+        
+        # Timestamps are stored as text, the same way to_sql writes them
+        rows = df.copy()
+        for col in rows.columns:
+            if pd.api.types.is_datetime64_any_dtype(rows[col]):
+                rows[col] = rows[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        rows = rows.astype(object)
+        rows = rows.where(rows.notna(), None)
+        
+        placeholders = ', '.join('?' * len(df.columns))
+        conn.executemany(
+            f'INSERT INTO companies VALUES ({placeholders})',
+            rows.itertuples(index=False, name=None)
+        )
+    
     def get_data_summary(self):
         """
         Get summary statistics of the consolidated data
@@ -160,6 +397,9 @@ class MCADataIntegrator:
         return summary
 
 if __name__ == "__main__":
+    # Configure logging only when run as a script; importers keep their own setup
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
     # Initialize data integrator
     integrator = MCADataIntegrator()
     
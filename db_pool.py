@@ -0,0 +1,111 @@
+"""
+Database Connection Pool - Shared SQLite connections for the pipeline scripts
+"""
+
+import sqlite3
+import queue
+import threading
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Default database used by the pipeline, tests and maintenance scripts
+DB_PATH = 'mca_insights.db'
+
+# Idle connections kept per database file; connections released beyond this are closed
+POOL_MAX_SIZE = 4
+
+# Applied once when a pooled connection is opened, then kept for its lifetime
+CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA busy_timeout=5000;
+"""
+
+class ConnectionPool:
+    """
+    Reuses open SQLite connections so their page and statement caches survive between calls
+    """
+
+    def __init__(self, db_path=DB_PATH, max_size=POOL_MAX_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        # Most recently released first, so the warmest cache is handed out next
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def _connect(self):
+        """
+        Open and tune a new connection; it may be used from any thread
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.executescript(CONNECTION_PRAGMAS)
+        return conn
+
+    def acquire(self):
+        """
+        Take an idle connection, opening a new one when none is free
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, discarding any uncommitted work
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """
+        Close every idle connection
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path=DB_PATH):
+    """
+    Process-wide pool for a database file, created on first use
+    """
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
+
+def get_conn(db_path=DB_PATH):
+    """
+    Borrow a pooled connection: `with get_conn() as conn: ...`
+
+    Transactions are left to the caller; anything not committed is rolled back on release.
+    """
+    return get_pool(db_path).connection()
+
+if __name__ == "__main__":
+    with get_conn() as conn:
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    print(f"Tables: {[name for (name,) in tables]}")
@@ -3,74 +3,107 @@
 Fix Database - Create missing company_changes table
 """
 
-import sqlite3
 import pandas as pd
 import logging
+from db_pool import get_conn
+from change_detection import CHANGE_INDEX_STATEMENTS, ensure_state_canon
+from data_integration import COMPANY_SEARCH_INDEX_SQL, SUMMARY_CACHE_SQL, clear_summary_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Lookup indexes created after seeding; names match the ones the integrator and change
+# detector create, so IF NOT EXISTS never builds a duplicate
+INDEX_STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS idx_cin ON companies(CIN)",
+    "CREATE INDEX IF NOT EXISTS idx_state ON companies(State)",
+    "CREATE INDEX IF NOT EXISTS idx_status ON companies(Status)",
+) + CHANGE_INDEX_STATEMENTS
+
+# Sample change records seeded into a freshly created company_changes table
+SAMPLE_CHANGES = (
+    ('U24299PN2019PTC181506', 'New Incorporation', 'All', '', 'ANURIUSWELL PHARMACEUTICALS', '2025-10-19', 'ANURIUSWELL PHARMACEUTICALS', 'Maharashtra', 'Active'),
+    ('U24299PN2019PTC187808', 'Field Update', 'Status', 'Active', 'Strike Off', '2025-10-19', 'SKYI FKUR BIOPOLYMERS', 'Maharashtra', 'Strike Off'),
+    ('U24299PN2020PTC192446', 'Field Update', 'Authorized_Capital', '100000', '500000', '2025-10-19', 'CHEMENGG RESEARCH', 'Maharashtra', 'Active')
+)
+
 def fix_database():
     """
     Create the missing company_changes table
     """
     try:
-        # Connect to database
-        conn = sqlite3.connect('mca_insights.db')
-        cursor = conn.cursor()
-        
-        # Check if company_changes table exists
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='company_changes'
-        """)
-        
-        if cursor.fetchone() is None:
-            logger.info("Creating company_changes table...")
-            
-            # Create company_changes table
-            cursor.execute('''
-                CREATE TABLE company_changes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    CIN TEXT,
-                    Change_Type TEXT,
-                    Field_Changed TEXT,
-                    Old_Value TEXT,
-                    New_Value TEXT,
-                    Date TEXT,
-                    Company_Name TEXT,
-                    State TEXT,
-                    Status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        # Connect to database through the shared pool, already tuned for bulk writes
+        with get_conn() as conn:
+            cursor = conn.cursor()
             
-            # Insert some sample data
-            sample_changes = [
-                ('U24299PN2019PTC181506', 'New Incorporation', 'All', '', 'ANURIUSWELL PHARMACEUTICALS', '2025-10-19', 'ANURIUSWELL PHARMACEUTICALS', 'Maharashtra', 'Active'),
-                ('U24299PN2019PTC187808', 'Field Update', 'Status', 'Active', 'Strike Off', '2025-10-19', 'SKYI FKUR BIOPOLYMERS', 'Maharashtra', 'Strike Off'),
-                ('U24299PN2020PTC192446', 'Field Update', 'Authorized_Capital', '100000', '500000', '2025-10-19', 'CHEMENGG RESEARCH', 'Maharashtra', 'Active')
-            ]
+            # Table creation and seeding commit together in one transaction
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                # Check if company_changes table exists
+                cursor.execute("""
+                    SELECT name FROM sqlite_master 
+                    WHERE type='table' AND name='company_changes'
+                """)
+                
+                if cursor.fetchone() is None:
+                    logger.info("Creating company_changes table...")
+                
+                    # Create company_changes table
+                    cursor.execute('''
+                        CREATE TABLE company_changes (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            CIN TEXT,
+                            Change_Type TEXT,
+                            Field_Changed TEXT,
+                            Old_Value TEXT,
+                            New_Value TEXT,
+                            Date TEXT,
+                            Company_Name TEXT,
+                            State TEXT,
+                            Status TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            State_Canon TEXT
+                        )
+                    ''')
+                
+                    # Insert some sample data
+                    cursor.executemany('''
+                        INSERT INTO company_changes 
+                        (CIN, Change_Type, Field_Changed, Old_Value, New_Value, Date, Company_Name, State, Status)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', SAMPLE_CHANGES)
+                
+                    clear_summary_cache(conn)
+                    logger.info("Sample data inserted into company_changes table")
+                
+                else:
+                    logger.info("company_changes table already exists")
+                
+                # Canonical state for the dashboard's state filter, also on older tables
+                ensure_state_canon(conn)
+                
+                # Check companies table
+                cursor.execute("SELECT COUNT(*) FROM companies")
+                count = cursor.fetchone()[0]
+                logger.info(f"Companies table has {count} records")
+                
+                # Tables the API reads; a companies table replaced without its search
+                # index has no sync triggers, so the index is rebuilt
+                cursor.execute(SUMMARY_CACHE_SQL)
+                cursor.execute("""
+                    SELECT 1 FROM sqlite_master 
+                    WHERE type='trigger' AND name='companies_fts_ai'
+                """)
+                if cursor.fetchone() is None:
+                    for statement in COMPANY_SEARCH_INDEX_SQL:
+                        cursor.execute(statement)
+                    logger.info("Company search index rebuilt")
+                
+                # Index once the rows are in, then refresh the planner statistics
+                for statement in INDEX_STATEMENTS:
+                    cursor.execute(statement)
+                cursor.execute("ANALYZE")
             
-            cursor.executemany('''
-                INSERT INTO company_changes 
-                (CIN, Change_Type, Field_Changed, Old_Value, New_Value, Date, Company_Name, State, Status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', sample_changes)
-            
-            logger.info("Sample data inserted into company_changes table")
-            
-        else:
-            logger.info("company_changes table already exists")
-        
-        # Check companies table
-        cursor.execute("SELECT COUNT(*) FROM companies")
-        count = cursor.fetchone()[0]
-        logger.info(f"Companies table has {count} records")
-        
-        conn.commit()
-        conn.close()
-        
         logger.info("Database fix completed successfully!")
         return True
         
@@ -0,0 +1,14 @@
+"""
+Gunicorn configuration for the MCA Insights Engine API
+"""
+
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '5000')}"
+
+# Threaded workers let SQLite reads and Gemini calls overlap across requests;
+# MCAAPI keeps one SQLite connection per worker thread.
+worker_class = 'gthread'
+workers = int(os.getenv('API_WORKERS', '4'))
+threads = int(os.getenv('API_THREADS', '8'))
+timeout = 60
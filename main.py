@@ -10,263 +10,343 @@ This script orchestrates the entire MCA Insights Engine pipeline:
 5. Dashboard and API
 
 Usage:
-    python main.py --mode [full|data|changes|enrichment|dashboard|api]
+    python main.py --mode [full|data|changes|enrichment|dashboard|api|refresh-cache]
 """
 
 import argparse
 import logging
+from logging.handlers import RotatingFileHandler
 import sys
 import os
+import glob
 from datetime import datetime
-import pandas as pd
+import functools
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 
-# Import our modules
-from data_integration import MCADataIntegrator
-from change_detection import ChangeDetector
-from web_enrichment import WebEnrichment
-from ai_features import AISummaryGenerator, ConversationalQueryEngine
+logger = logging.getLogger(__name__)
+
+# Size at which mca_insights.log is rotated, and how many old logs are kept
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 3
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('mca_insights.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+def _configure_logging():
+    """
+    Send logs to stdout and a rotating log file; only the CLI entry point installs handlers
+    """
+    # basicConfig leaves an already configured root logger untouched
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            RotatingFileHandler('mca_insights.log', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+# Companies enriched when no change log is available yet
+SAMPLE_COMPANIES = (
+    ('U24299PN2019PTC181506', 'ANURIUSWELL PHARMACEUTICALS PRIVATE LIMITED', 'Maharashtra', 'Active'),
+    ('U24299PN2019PTC187808', 'SKYI FKUR BIOPOLYMERS PRIVATE LIMITED', 'Maharashtra', 'Active'),
+    ('U24299PN2020PTC192446', 'CHEMENGG RESEARCH PRIVATE LIMITED', 'Maharashtra', 'Active')
 )
-logger = logging.getLogger(__name__)
+
+def _latest_change_log():
+    """
+    Path of the most recent change log CSV, or None if change detection has not written one
+    """
+    # Timestamped names sort chronologically; each log holds the full change set of its run
+    change_logs = sorted(glob.glob('change_logs_*.csv'))
+    return change_logs[-1] if change_logs else None
+
+def _log_failures(message):
+    """
+    Log any exception from a pipeline step under the given message and report failure
+    """
+    def decorator(step_function):
+        @functools.wraps(step_function)
+        def wrapper(*args, **kwargs):
+            try:
+                return step_function(*args, **kwargs)
+            except Exception as e:
+                logger.error("%s: %s", message, e)
+                return False
+        return wrapper
+    return decorator
 
 class MCAInsightsEngine:
     """
     Main orchestration class for MCA Insights Engine
     """
     
-    def __init__(self):
-        self.data_integrator = MCADataIntegrator()
-        self.change_detector = ChangeDetector()
-        self.web_enricher = WebEnrichment()
-        self.ai_summary_gen = AISummaryGenerator()
-        self.query_engine = ConversationalQueryEngine()
-        
-    def run_data_integration(self):
+    # Subsystems and their heavy imports (pandas, requests, the AI client) are loaded on
+    # first use, so the dashboard and API modes start without them
+    
+    @cached_property
+    def data_integrator(self):
+        """
+        Data integrator, created on first use
+        """
+        from data_integration import MCADataIntegrator
+        return MCADataIntegrator()
+    
+    @cached_property
+    def change_detector(self):
         """
-        Run data integration pipeline
+        Change detector, created on first use
+        """
+        from change_detection import ChangeDetector
+        return ChangeDetector()
+    
+    @cached_property
+    def web_enricher(self):
+        """
+        Web enricher, created on first use
+        """
+        from web_enrichment import WebEnrichment
+        return WebEnrichment()
+    
+    @cached_property
+    def ai_summary_gen(self):
+        """
+        AI summary generator, created on first use
+        """
+        from ai_features import AISummaryGenerator
+        return AISummaryGenerator()
+    
+    @cached_property
+    def query_engine(self):
+        """
+        Conversational query engine, created on first use
+        """
+        from ai_features import ConversationalQueryEngine
+        return ConversationalQueryEngine()
+    
+    @_log_failures("Error in data integration")
+    def run_data_integration(self, force=False):
+        """
+        Run data integration pipeline, unless the database already reflects the state CSVs
         """
         logger.info("Starting data integration pipeline...")
         
-        try:
-            # Consolidate data from all states
-            master_data = self.data_integrator.consolidate_data()
+        if not force and self.data_integrator.is_database_current():
+            logger.info("Database is up to date with the state CSVs; skipping data integration")
+            return True
+        
+        # Consolidate data from all states
+        master_data = self.data_integrator.consolidate_data()
+        
+        if master_data is not None:
+            # Create database
+            self.data_integrator.create_database()
             
-            if master_data is not None:
-                # Create database
-                self.data_integrator.create_database()
-                
-                # Get and log summary
-                summary = self.data_integrator.get_data_summary()
-                logger.info(f"Data integration completed successfully")
-                logger.info(f"Total companies: {summary['total_companies']}")
-                logger.info(f"States processed: {list(summary['states'].keys())}")
-                
-                return True
-            else:
-                logger.error("Data integration failed")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error in data integration: {str(e)}")
+            # Get and log summary
+            summary = self.data_integrator.get_data_summary()
+            logger.info("Data integration completed successfully")
+            logger.info("Total companies: %s", summary['total_companies'])
+            logger.info("States processed: %s", list(summary['states'].keys()))
+            
+            return True
+        else:
+            logger.error("Data integration failed")
             return False
     
+    @_log_failures("Error in change detection")
     def run_change_detection(self):
         """
         Run change detection pipeline
         """
         logger.info("Starting change detection pipeline...")
         
-        try:
-            # Process daily changes from snapshots
-            snapshot_files = ['snapshot_day1.csv', 'snapshot_day2.csv', 'snapshot_day3.csv']
-            changes = self.change_detector.process_daily_changes(snapshot_files)
+        # Process daily changes from snapshots
+        snapshot_files = ['snapshot_day1.csv', 'snapshot_day2.csv', 'snapshot_day3.csv']
+        changes = self.change_detector.process_daily_changes(snapshot_files)
+        
+        if not changes.empty:
+            # Save change logs
+            self.change_detector.save_change_logs('csv')
+            self.change_detector.save_change_logs('json')
             
-            if changes:
-                # Save change logs
-                self.change_detector.save_change_logs('csv')
-                self.change_detector.save_change_logs('json')
-                
-                # Update master database
-                self.change_detector.update_master_database()
-                
-                # Get and log summary
-                summary = self.change_detector.get_change_summary()
-                logger.info(f"Change detection completed successfully")
-                logger.info(f"Total changes detected: {summary['total_changes']}")
-                logger.info(f"Change types: {summary['change_types']}")
-                
-                return True
-            else:
-                logger.warning("No changes detected")
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error in change detection: {str(e)}")
-            return False
+            # Update master database
+            self.change_detector.update_master_database()
+            
+            # Get and log summary
+            summary = self.change_detector.get_change_summary()
+            logger.info("Change detection completed successfully")
+            logger.info("Total changes detected: %s", summary['total_changes'])
+            logger.info("Change types: %s", summary['change_types'])
+            
+            return True
+        else:
+            logger.warning("No changes detected")
+            return True
     
+    @_log_failures("Error in web enrichment")
     def run_web_enrichment(self, sample_size=50):
         """
         Run web enrichment pipeline
         """
         logger.info("Starting web enrichment pipeline...")
         
-        try:
-            # Load sample companies from changes (if available)
-            try:
-                changes_df = pd.read_csv('change_logs_*.csv')
-                sample_companies = changes_df[['CIN', 'Company_Name', 'State', 'Status']].drop_duplicates()
-            except:
-                # Fallback: create sample from master data
-                logger.info("Using fallback sample companies")
-                sample_companies = pd.DataFrame({
-                    'CIN': ['U24299PN2019PTC181506', 'U24299PN2019PTC187808', 'U24299PN2020PTC192446'],
-                    'Company_Name': ['ANURIUSWELL PHARMACEUTICALS PRIVATE LIMITED', 
-                                    'SKYI FKUR BIOPOLYMERS PRIVATE LIMITED',
-                                    'CHEMENGG RESEARCH PRIVATE LIMITED'],
-                    'State': ['Maharashtra', 'Maharashtra', 'Maharashtra'],
-                    'Status': ['Active', 'Active', 'Active']
-                })
+        import pandas as pd
+        
+        # Load sample companies from changes (if available)
+        change_log = _latest_change_log()
+        if change_log is not None:
+            changes_df = pd.read_csv(change_log, engine='pyarrow', usecols=['CIN', 'Company_Name', 'State', 'Status'])
+            sample_companies = changes_df.drop_duplicates()
+        else:
+            # Fallback: create sample from master data
+            logger.info("Using fallback sample companies")
+            sample_companies = pd.DataFrame.from_records(
+                SAMPLE_COMPANIES, columns=['CIN', 'Company_Name', 'State', 'Status']
+            ).astype({'CIN': 'string[pyarrow]', 'State': 'category', 'Status': 'category'})
+        
+        # Enrich sample companies
+        enriched_data = self.web_enricher.enrich_sample_companies(sample_companies, sample_size)
+        
+        if enriched_data:
+            # Save enriched data
+            self.web_enricher.save_enriched_data()
             
-            # Enrich sample companies
-            enriched_data = self.web_enricher.enrich_sample_companies(sample_companies, sample_size)
+            # Get and log summary
+            summary = self.web_enricher.get_enrichment_summary()
+            logger.info("Web enrichment completed successfully")
+            logger.info("Total enriched records: %s", summary['total_enriched_records'])
+            logger.info("Sources used: %s", summary['sources_used'])
             
-            if enriched_data:
-                # Save enriched data
-                self.web_enricher.save_enriched_data()
-                
-                # Get and log summary
-                summary = self.web_enricher.get_enrichment_summary()
-                logger.info(f"Web enrichment completed successfully")
-                logger.info(f"Total enriched records: {summary['total_enriched_records']}")
-                logger.info(f"Sources used: {summary['sources_used']}")
-                
-                return True
-            else:
-                logger.warning("No enrichment data generated")
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error in web enrichment: {str(e)}")
-            return False
+            return True
+        else:
+            logger.warning("No enrichment data generated")
+            return True
     
+    @_log_failures("Error in AI features")
     def run_ai_features(self):
         """
         Run AI features pipeline
         """
         logger.info("Starting AI features pipeline...")
         
-        try:
-            # Load changes data for AI summary
-            try:
-                changes_df = pd.read_csv('change_logs_*.csv')
-            except:
-                logger.info("No changes data found, creating sample data")
-                changes_df = pd.DataFrame({
-                    'CIN': ['U24299PN2019PTC181506', 'U24299PN2019PTC187808'],
-                    'Change_Type': ['New Incorporation', 'Field Update'],
-                    'Field_Changed': ['All', 'Status'],
-                    'Old_Value': ['', 'Active'],
-                    'New_Value': ['ANURIUSWELL PHARMACEUTICALS', 'Strike Off'],
-                    'Date': [datetime.now(), datetime.now()],
-                    'Company_Name': ['ANURIUSWELL PHARMACEUTICALS', 'SKYI FKUR BIOPOLYMERS'],
-                    'State': ['Maharashtra', 'Maharashtra'],
-                    'Status': ['Active', 'Strike Off']
-                })
-            
-            # Generate AI summary
-            summary = self.ai_summary_gen.generate_daily_summary(changes_df)
-            
-            # Save summary
-            filename = self.ai_summary_gen.save_summary(summary)
-            
-            logger.info(f"AI features completed successfully")
-            logger.info(f"Summary type: {summary['summary_type']}")
-            logger.info(f"Summary saved to: {filename}")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error in AI features: {str(e)}")
-            return False
+        import pandas as pd
+        
+        # Load changes data for AI summary
+        change_log = _latest_change_log()
+        if change_log is not None:
+            # Low-cardinality columns load as categoricals so the summary counts run on codes
+            changes_df = pd.read_csv(change_log, engine='pyarrow', dtype={
+                'Change_Type': 'category',
+                'State': 'category',
+                'Field_Changed': 'category'
+            })
+        else:
+            logger.info("No changes data found, creating sample data")
+            from ai_features import sample_changes
+            changes_df = sample_changes()
+        
+        # Generate AI summary
+        summary = self.ai_summary_gen.generate_daily_summary(changes_df)
+        
+        # Save summary
+        filename = self.ai_summary_gen.save_summary(summary)
+        
+        logger.info("AI features completed successfully")
+        logger.info("Summary type: %s", summary['summary_type'])
+        logger.info("Summary saved to: %s", filename)
+        
+        return True
     
+    @_log_failures("Error refreshing summary cache")
+    def run_summary_cache_refresh(self):
+        """
+        Precompute the API's dashboard and change-analysis aggregates
+        """
+        logger.info("Refreshing API summary cache...")
+        
+        from api import MCAAPI
+        return MCAAPI().refresh_summary_cache()
+    
+    @_log_failures("Error running dashboard")
     def run_dashboard(self):
         """
         Run Streamlit dashboard
         """
         logger.info("Starting Streamlit dashboard...")
         
-        try:
-            import subprocess
-            subprocess.run([sys.executable, "-m", "streamlit", "run", "dashboard.py"])
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error running dashboard: {str(e)}")
-            return False
+        # Serve from this interpreter rather than spawning and waiting on a second one
+        from streamlit.web import cli as streamlit_cli
+        streamlit_cli.main(["run", "dashboard.py"], standalone_mode=False)
+        return True
     
+    @_log_failures("Error running API")
     def run_api(self):
         """
         Run Flask API server
         """
         logger.info("Starting Flask API server...")
         
+        from api import app
+        app.run(debug=False, host='0.0.0.0', port=5000)
+        return True
+    
+    def _run_step(self, step_name, step_function):
+        """
+        Run one pipeline step, logging its outcome
+        """
+        logger.info("Running %s...", step_name)
         try:
-            from api import app
-            app.run(debug=False, host='0.0.0.0', port=5000)
-            return True
+            success = step_function()
             
+            if success:
+                logger.info("%s completed successfully", step_name)
+            else:
+                logger.error("%s failed", step_name)
+            return success
+                
         except Exception as e:
-            logger.error(f"Error running API: {str(e)}")
+            logger.error("Error in %s: %s", step_name, e)
             return False
     
-    def run_full_pipeline(self):
+    def run_full_pipeline(self, parallel=True, force=False):
         """
         Run the complete MCA Insights Engine pipeline
         """
         logger.info("Starting full MCA Insights Engine pipeline...")
         
-        pipeline_steps = [
-            ("Data Integration", self.run_data_integration),
-            ("Change Detection", self.run_change_detection),
-            ("Web Enrichment", lambda: self.run_web_enrichment(50)),
-            ("AI Features", self.run_ai_features)
+        # Steps in the same stage do not depend on each other: enrichment (network-bound)
+        # and the AI summary both read the change logs but not each other's output
+        pipeline_stages = [
+            [("Data Integration", lambda: self.run_data_integration(force))],
+            [("Change Detection", self.run_change_detection)],
+            [("Web Enrichment", lambda: self.run_web_enrichment(50)),
+             ("AI Features", self.run_ai_features)],
+            [("Summary Cache", self.run_summary_cache_refresh)]
         ]
         
         results = {}
         
-        for step_name, step_function in pipeline_steps:
-            logger.info(f"Running {step_name}...")
-            try:
-                success = step_function()
-                results[step_name] = success
-                
-                if success:
-                    logger.info(f"{step_name} completed successfully")
-                else:
-                    logger.error(f"{step_name} failed")
-                    
-            except Exception as e:
-                logger.error(f"Error in {step_name}: {str(e)}")
-                results[step_name] = False
+        for stage in pipeline_stages:
+            if parallel and len(stage) > 1:
+                with ThreadPoolExecutor(max_workers=len(stage), thread_name_prefix='mca-step') as executor:
+                    futures = {
+                        step_name: executor.submit(self._run_step, step_name, step_function)
+                        for step_name, step_function in stage
+                    }
+                # Collected in stage order so the summary lists steps as before
+                results.update({step_name: future.result() for step_name, future in futures.items()})
+            else:
+                for step_name, step_function in stage:
+                    results[step_name] = self._run_step(step_name, step_function)
         
         # Summary
         logger.info("Pipeline execution summary:")
         for step_name, success in results.items():
             status = "✅ SUCCESS" if success else "❌ FAILED"
-            logger.info(f"  {step_name}: {status}")
+            logger.info("  %s: %s", step_name, status)
         
         successful_steps = sum(results.values())
         total_steps = len(results)
         
-        logger.info(f"Pipeline completed: {successful_steps}/{total_steps} steps successful")
+        logger.info("Pipeline completed: %s/%s steps successful", successful_steps, total_steps)
         
         return results
 
@@ -275,30 +355,35 @@ def main():
     Main function to handle command line arguments and run the pipeline
     """
     parser = argparse.ArgumentParser(description='MCA Insights Engine')
-    parser.add_argument('--mode', choices=['full', 'data', 'changes', 'enrichment', 'dashboard', 'api'], 
+    parser.add_argument('--mode', choices=['full', 'data', 'changes', 'enrichment', 'dashboard', 'api', 'refresh-cache'], 
                        default='full', help='Pipeline mode to run')
     parser.add_argument('--sample-size', type=int, default=50, 
                        help='Sample size for web enrichment')
+    parser.add_argument('--parallel', action=argparse.BooleanOptionalAction, default=True,
+                       help='Run independent full-pipeline steps concurrently')
+    parser.add_argument('--force', action='store_true',
+                       help='Rebuild the database even if the state CSVs are unchanged')
     parser.add_argument('--verbose', '-v', action='store_true', 
                        help='Enable verbose logging')
     
     args = parser.parse_args()
     
+    _configure_logging()
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
     # Initialize the engine
     engine = MCAInsightsEngine()
     
-    logger.info(f"MCA Insights Engine started in {args.mode} mode")
-    logger.info(f"Timestamp: {datetime.now().isoformat()}")
+    logger.info("MCA Insights Engine started in %s mode", args.mode)
+    logger.info("Timestamp: %s", datetime.now().isoformat())
     
     try:
         if args.mode == 'full':
-            results = engine.run_full_pipeline()
+            results = engine.run_full_pipeline(parallel=args.parallel, force=args.force)
             success = all(results.values())
         elif args.mode == 'data':
-            success = engine.run_data_integration()
+            success = engine.run_data_integration(force=args.force)
         elif args.mode == 'changes':
             success = engine.run_change_detection()
         elif args.mode == 'enrichment':
@@ -307,8 +392,10 @@ def main():
             success = engine.run_dashboard()
         elif args.mode == 'api':
             success = engine.run_api()
+        elif args.mode == 'refresh-cache':
+            success = engine.run_summary_cache_refresh()
         else:
-            logger.error(f"Unknown mode: {args.mode}")
+            logger.error("Unknown mode: %s", args.mode)
             success = False
         
         if success:
@@ -322,7 +409,7 @@ def main():
         logger.info("Pipeline execution interrupted by user")
         sys.exit(1)
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
         sys.exit(1)
 
 if __name__ == "__main__":
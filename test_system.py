@@ -7,10 +7,10 @@ without running the full pipeline.
 """
 
 import pandas as pd
-import sqlite3
 import os
-from datetime import datetime
+import argparse
 import logging
+from db_pool import get_conn
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -50,17 +50,18 @@ def test_database():
     
     try:
         if os.path.exists('mca_insights.db'):
-            conn = sqlite3.connect('mca_insights.db')
-            
-            # Test basic queries
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM companies")
-            count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT State, COUNT(*) FROM companies GROUP BY State LIMIT 5")
-            states = cursor.fetchall()
-            
-            conn.close()
+            with get_conn() as conn:
+                # Test basic queries; the window total over all state groups is the company count
+                cursor = conn.cursor()
+                cursor.arraysize = 5
+                cursor.execute("""
+                    SELECT State, COUNT(*), SUM(COUNT(*)) OVER ()
+                    FROM companies GROUP BY State ORDER BY 2 DESC LIMIT 5
+                """)
+                rows = cursor.fetchmany()
+                
+                count = rows[0][2] if rows else 0
+                states = [(state, state_count) for state, state_count, _ in rows]
             
             print(f"✅ Database test successful: {count} companies")
             print(f"   Top states: {states}")
@@ -73,6 +74,38 @@ def test_database():
         print(f"❌ Database test failed: {str(e)}")
         return False
 
+def test_change_detection():
+    """
+    Test change detection against no previous snapshot and against itself
+    """
+    print("\n🧪 Testing Change Detection...")
+    
+    try:
+        from change_detection import ChangeDetector
+        
+        detector = ChangeDetector()
+        snapshot = detector.load_snapshot('snapshot_day1.csv')
+        change_date = snapshot['snapshot_date'].iloc[0]
+        
+        # Without a previous snapshot every company is a new incorporation
+        first_run = detector.detect_changes(None, snapshot, change_date)
+        if len(first_run) != len(snapshot) or (first_run['Change_Type'] != 'New Incorporation').any():
+            print(f"❌ First run reported {len(first_run)} changes for {len(snapshot)} companies")
+            return False
+        
+        # An identical snapshot has nothing to diff
+        unchanged = detector.detect_changes(snapshot, snapshot, change_date)
+        if len(unchanged) != 0:
+            print(f"❌ Identical snapshots reported {len(unchanged)} changes")
+            return False
+        
+        print(f"✅ Change detection test successful: {len(first_run)} new incorporations on first run")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Change detection test failed: {str(e)}")
+        return False
+
 def test_ai_features():
     """
     Test AI features functionality
@@ -80,25 +113,12 @@ def test_ai_features():
     print("\n🧪 Testing AI Features...")
     
     try:
-        from ai_features import AISummaryGenerator, ConversationalQueryEngine
+        from ai_features import AISummaryGenerator, ConversationalQueryEngine, sample_changes
         
         # Test AI Summary Generator
         summary_gen = AISummaryGenerator()
         
-        # Create sample data
-        sample_changes = pd.DataFrame({
-            'CIN': ['U24299PN2019PTC181506', 'U24299PN2019PTC187808'],
-            'Change_Type': ['New Incorporation', 'Field Update'],
-            'Field_Changed': ['All', 'Status'],
-            'Old_Value': ['', 'Active'],
-            'New_Value': ['ANURIUSWELL PHARMACEUTICALS', 'Strike Off'],
-            'Date': [datetime.now(), datetime.now()],
-            'Company_Name': ['ANURIUSWELL PHARMACEUTICALS', 'SKYI FKUR BIOPOLYMERS'],
-            'State': ['Maharashtra', 'Maharashtra'],
-            'Status': ['Active', 'Strike Off']
-        })
-        
-        summary = summary_gen.generate_daily_summary(sample_changes)
+        summary = summary_gen.generate_daily_summary(sample_changes())
         
         print(f"✅ AI Summary Generator test successful: {summary['summary_type']}")
         
@@ -154,13 +174,25 @@ def test_api_endpoints():
     print("\n🧪 Testing API Endpoints...")
     
     try:
-        from api import MCAAPI
+        from api import MCAAPI, MAX_CHAT_BATCH, app
         
         api = MCAAPI()
         
         # Test search functionality
         results = api.search_company('ANURIUSWELL', 'name')
         
+        # Oversized chat batches are rejected before any query is answered
+        client = app.test_client()
+        response = client.post('/api/chat/batch', json={'queries': ['Show new incorporations'] * (MAX_CHAT_BATCH + 1)})
+        if response.status_code != 400:
+            print(f"❌ Chat batch above {MAX_CHAT_BATCH} queries returned {response.status_code}")
+            return False
+        
+        response = client.post('/api/chat/batch', json={'queries': ['Show new incorporations']})
+        if response.status_code != 200:
+            print(f"❌ Chat batch of one query returned {response.status_code}")
+            return False
+        
         print(f"✅ API test successful: {len(results)} search results")
         return True
         
@@ -168,9 +200,9 @@ def test_api_endpoints():
         print(f"❌ API test failed: {str(e)}")
         return False
 
-def main():
+def main(fail_fast=False):
     """
-    Run all tests
+    Run all tests, stopping at the first failure when fail_fast is set
     """
     print("🚀 MCA Insights Engine - Test Suite")
     print("=" * 50)
@@ -178,6 +210,7 @@ def main():
     tests = [
         ("Data Integration", test_data_integration),
         ("Database", test_database),
+        ("Change Detection", test_change_detection),
         ("AI Features", test_ai_features),
         ("Web Enrichment", test_web_enrichment),
         ("API Endpoints", test_api_endpoints)
@@ -192,6 +225,11 @@ def main():
         except Exception as e:
             print(f"❌ {test_name} test crashed: {str(e)}")
             results[test_name] = False
+        
+        # Later tests import heavier modules; skip them once something has failed
+        if fail_fast and not results[test_name]:
+            print(f"⏹️  Stopping after {test_name} failure (--fail-fast)")
+            break
     
     # Summary
     print("\n" + "=" * 50)
@@ -199,7 +237,7 @@ def main():
     print("=" * 50)
     
     passed = 0
-    total = len(results)
+    total = len(tests)
     
     for test_name, success in results.items():
         status = "✅ PASS" if success else "❌ FAIL"
@@ -217,5 +255,10 @@ def main():
     return passed == total
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description='MCA Insights Engine test suite')
+    parser.add_argument('--fail-fast', action='store_true',
+                       help='Stop at the first failing test')
+    args = parser.parse_args()
+    
+    success = main(fail_fast=args.fail_fast)
     exit(0 if success else 1)
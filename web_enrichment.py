@@ -1,26 +1,262 @@
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import time
-import json
-from bs4 import BeautifulSoup
+import orjson
+import csv
 import logging
 from urllib.parse import quote
 import random
+import os
+import sqlite3
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from db_pool import get_conn
 
 logger = logging.getLogger(__name__)
 
+# Source lookups spend their time waiting on the network, so they run side by side on
+# one thread pool shared by every WebEnrichment instance
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', '16'))
+enrichment_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='mca-enrich')
+
+# Lookup URL per source, filled in with the company's CIN
+URL_TEMPLATES = {
+    'zauba': 'https://www.zaubacorp.com/company/{cin}',
+    'mca_api': 'https://api.mca.gov.in/api/v1/company/{cin}',
+    'gst': 'https://www.gst.gov.in/search-taxpayer'
+}
+
+# How long a cached source response is reused: company status from MCA goes stale
+# quickly, directors and GST/PAN registrations rarely change
+ENRICHMENT_CACHE_TTL_SECONDS = {
+    'zauba': 6 * 3600,
+    'mca_api': 30,
+    'gst': 24 * 3600
+}
+
+# Expired responses are kept this long as a fallback for when their source is down
+ENRICHMENT_STALE_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# CINs looked up per cache query, well under SQLite's bound-variable limit
+CACHE_LOOKUP_BATCH = 500
+
+# Requests allowed per source as (requests per second, burst), kept under each service's limit
+SOURCE_RATE_LIMITS = {
+    'zauba': (10, 20),
+    'mca_api': (30, 30),
+    'gst': (10, 20)
+}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` calls per second with bursts of up to `capacity`
+    """
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        Take one token, waiting only as long as it takes for the next one to accrue
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                wait = (1 - self._tokens) / self.rate
+            
+            time.sleep(wait)
+
+# One bucket per source, shared by every pool thread and WebEnrichment instance
+source_limiters = {source: TokenBucket(rate, burst) for source, (rate, burst) in SOURCE_RATE_LIMITS.items()}
+
+# Consecutive failed lookups after which a source is skipped, and for how long
+SOURCE_FAILURE_THRESHOLD = 3
+SOURCE_COOLDOWN_SECONDS = 30
+
+class CircuitBreaker:
+    """
+    Stops calling a source for `cooldown` seconds once `threshold` lookups in a row have failed
+    """
+    
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """
+        Whether the source may be called right now
+        """
+        with self._lock:
+            return time.monotonic() >= self._open_until
+    
+    def record(self, succeeded):
+        """
+        Count a lookup's outcome; after a cooldown a single further failure reopens the breaker
+        """
+        with self._lock:
+            if succeeded:
+                self._failures = 0
+                return
+            
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+
+source_breakers = {source: CircuitBreaker(SOURCE_FAILURE_THRESHOLD, SOURCE_COOLDOWN_SECONDS) for source in SOURCE_RATE_LIMITS}
+
+# Lookups currently running, keyed by (source, cin), so duplicate requests share one call
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _forget_inflight(key, future):
+    """
+    Drop a finished lookup from the in-flight map
+    """
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+@functools.lru_cache(maxsize=10000)
+def _slug(company_name):
+    """
+    Company name as used in its website domain and email address
+    """
+    return company_name.lower().replace(" ", "")
+
+@functools.lru_cache(maxsize=10000)
+def _gst_fields(cin):
+    """
+    GST and PAN numbers derived from a CIN
+    """
+    return f'29{cin[-6:]}1Z1', f'ABCDE{cin[-4:]}F'
+
 class WebEnrichment:
     """
     Class to enrich company data using publicly available web sources
     """
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    # Sources queried for every company, in the order their records are returned
+    SOURCES = ('zauba', 'mca_api', 'gst')
+    
+    def __init__(self, cache_db_path='mca_insights.db'):
+        # requests.Session is not thread-safe, so each pool thread gets its own
+        self._local = threading.local()
         self.enriched_data = []
+        self.cache_db_path = cache_db_path
+        self.cache_enabled = self._ensure_response_cache()
+    
+    @property
+    def session(self):
+        """
+        HTTP session for the calling thread, created on its first request
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+            # A session serves one thread at a time, so one keep-alive connection per
+            # source host is enough; it is reused for every lookup that thread makes
+            adapter = HTTPAdapter(pool_connections=len(self.SOURCES), pool_maxsize=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session = session
+        return session
+    
+    def _ensure_response_cache(self):
+        """
+        Create the table holding source responses keyed by (source, CIN)
+        """
+        try:
+            with get_conn(self.cache_db_path) as conn:
+                with conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS enrichment_cache (
+                            source TEXT NOT NULL,
+                            cin TEXT NOT NULL,
+                            payload BLOB NOT NULL,
+                            fetched_at REAL NOT NULL,
+                            PRIMARY KEY (source, cin)
+                        )
+                    """)
+            return True
+            
+        except sqlite3.Error as e:
+            logger.warning(f"Enrichment response cache unavailable: {str(e)}")
+            return False
+    
+    def _load_cached_responses(self, cins):
+        """
+        Cached responses for the given CINs as (fresh, stale) dicts, read in a few batched queries
+        """
+        if not self.cache_enabled or not cins:
+            return {}, {}
+        
+        now = time.time()
+        cached = {}
+        stale = {}
+        unique_cins = list(dict.fromkeys(cins))
+        
+        try:
+            with get_conn(self.cache_db_path) as conn:
+                for start in range(0, len(unique_cins), CACHE_LOOKUP_BATCH):
+                    batch = unique_cins[start:start + CACHE_LOOKUP_BATCH]
+                    rows = conn.execute(
+                        f"SELECT source, cin, payload, fetched_at FROM enrichment_cache "
+                        f"WHERE cin IN ({', '.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    
+                    for source, cin, payload, fetched_at in rows:
+                        age = now - fetched_at
+                        if age < ENRICHMENT_CACHE_TTL_SECONDS.get(source, 0):
+                            cached[(source, cin)] = orjson.loads(payload)
+                        elif age < ENRICHMENT_STALE_MAX_AGE_SECONDS:
+                            stale[(source, cin)] = payload
+                            
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read enrichment cache: {str(e)}")
+            return {}, {}
         
+        return cached, stale
+    
+    def _store_cached_responses(self, responses):
+        """
+        Save freshly fetched (source, cin, record) responses in one transaction
+        """
+        if not self.cache_enabled or not responses:
+            return
+        
+        now = time.time()
+        try:
+            with get_conn(self.cache_db_path) as conn:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO enrichment_cache (source, cin, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                        [(source, cin, orjson.dumps(data), now) for source, cin, data in responses]
+                    )
+                    
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update enrichment cache: {str(e)}")
+    
     def enrich_from_zauba(self, cin, company_name):
         """
         Enrich company data from ZaubaCorp (simulated)
@@ -30,6 +266,7 @@ class WebEnrichment:
             time.sleep(random.uniform(1, 2))
             
             # Mock enrichment data (in real implementation, this would be actual API calls)
+            slug = _slug(company_name)
             enrichment_data = {
                 'CIN': cin,
                 'COMPANY_NAME': company_name,
@@ -37,12 +274,12 @@ class WebEnrichment:
                 'STATUS': 'Active',
                 'SOURCE': 'ZaubaCorp',
                 'FIELD': 'Director_Names',
-                'SOURCE_URL': f'https://www.zaubacorp.com/company/{cin}',
+                'SOURCE_URL': URL_TEMPLATES['zauba'].format_map({'cin': cin}),
                 'ENRICHED_DATA': {
                     'directors': ['John Doe', 'Jane Smith'],
                     'sector': 'Technology',
-                    'website': f'https://www.{company_name.lower().replace(" ", "")}.com',
-                    'email': f'info@{company_name.lower().replace(" ", "")}.com'
+                    'website': f'https://www.{slug}.com',
+                    'email': f'info@{slug}.com'
                 }
             }
             
@@ -67,7 +304,7 @@ class WebEnrichment:
                 'STATUS': 'Active',
                 'SOURCE': 'MCA_API_Setu',
                 'FIELD': 'Company_Details',
-                'SOURCE_URL': f'https://api.mca.gov.in/api/v1/company/{cin}',
+                'SOURCE_URL': URL_TEMPLATES['mca_api'].format_map({'cin': cin}),
                 'ENRICHED_DATA': {
                     'registration_number': cin,
                     'company_type': 'Private Limited',
@@ -91,6 +328,7 @@ class WebEnrichment:
             time.sleep(random.uniform(1, 1.5))
             
             # Mock GST Portal data
+            gst_number, pan_number = _gst_fields(cin)
             enrichment_data = {
                 'CIN': cin,
                 'COMPANY_NAME': company_name,
@@ -98,10 +336,10 @@ class WebEnrichment:
                 'STATUS': 'Active',
                 'SOURCE': 'GST_Portal',
                 'FIELD': 'GST_Details',
-                'SOURCE_URL': f'https://www.gst.gov.in/search-taxpayer',
+                'SOURCE_URL': URL_TEMPLATES['gst'].format_map({'cin': cin}),
                 'ENRICHED_DATA': {
-                    'gst_number': f'29{cin[-6:]}1Z1',
-                    'pan_number': f'ABCDE{cin[-4:]}F',
+                    'gst_number': gst_number,
+                    'pan_number': pan_number,
                     'registration_date': '2020-01-15',
                     'business_nature': 'Manufacturing'
                 }
@@ -113,32 +351,119 @@ class WebEnrichment:
             logger.error(f"Error enriching from GST Portal for {cin}: {str(e)}")
             return None
     
-    def enrich_company(self, cin, company_name, sources=['zauba', 'mca_api', 'gst']):
+    def _fetch_source(self, source, cin, company_name):
         """
-        Enrich a single company using multiple sources
+        Query one enrichment source; unknown sources and sources that keep failing return None
         """
-        enriched_records = []
+        if source not in source_limiters:
+            return None
+        
+        breaker = source_breakers[source]
+        if not breaker.allow():
+            logger.info(f"Skipping {source} for {cin}: source is failing, retrying after cooldown")
+            return None
         
+        source_limiters[source].acquire()
+        
+        try:
+            if source == 'zauba':
+                data = self.enrich_from_zauba(cin, company_name)
+            elif source == 'mca_api':
+                data = self.enrich_from_mca_api(cin)
+            else:
+                data = self.enrich_from_gst_portal(cin, company_name)
+        except Exception:
+            breaker.record(False)
+            raise
+        
+        breaker.record(data is not None)
+        return data
+    
+    def _submit_company(self, cin, company_name, sources, cached):
+        """
+        Start one lookup per source on the shared pool, answering from the cache where possible
+        and joining any identical lookup that is already running
+        """
+        submitted = []
         for source in sources:
+            key = (source, cin)
+            if key in cached:
+                future = Future()
+                future.set_result(cached[key])
+                submitted.append((source, future))
+                continue
+            
+            with _inflight_lock:
+                future = _inflight.get(key)
+                started = future is None
+                if started:
+                    future = enrichment_executor.submit(self._fetch_source, source, cin, company_name)
+                    _inflight[key] = future
+            
+            # Registered outside the lock: it runs immediately if the lookup has already finished
+            if started:
+                future.add_done_callback(functools.partial(_forget_inflight, key))
+            submitted.append((source, future))
+        
+        return submitted
+    
+    def _collect_company(self, cin, futures):
+        """
+        Wait for a company's lookups and return (source, record) pairs in source order; failed lookups give None
+        """
+        results = []
+        
+        for source, future in futures:
             try:
-                if source == 'zauba':
-                    data = self.enrich_from_zauba(cin, company_name)
-                elif source == 'mca_api':
-                    data = self.enrich_from_mca_api(cin)
-                elif source == 'gst':
-                    data = self.enrich_from_gst_portal(cin, company_name)
-                else:
-                    continue
+                data = future.result()
                 
-                if data:
-                    enriched_records.append(data)
-                    
             except Exception as e:
                 logger.error(f"Error enriching {cin} from {source}: {str(e)}")
-                continue
+                data = None
+            
+            results.append((source, data or None))
+        
+        return results
+    
+    def _enrich_companies(self, companies, sources):
+        """
+        Enrich (cin, company_name) pairs, querying only the sources without a fresh cached response
+        """
+        cached, stale = self._load_cached_responses([cin for cin, _ in companies])
+        
+        # Every lookup is queued up front; the pool size (ENRICHMENT_WORKERS) bounds
+        # how many requests are in flight at once
+        pending = [
+            (cin, self._submit_company(cin, company_name, sources, cached))
+            for cin, company_name in companies
+        ]
         
+        enriched_records = []
+        fetched = {}
+        for cin, futures in pending:
+            for source, data in self._collect_company(cin, futures):
+                if data is None:
+                    # Fall back to the last known response, marked as stale, while the source is down
+                    if (source, cin) in stale:
+                        logger.warning(f"Using stale {source} data for {cin}")
+                        data = orjson.loads(stale[(source, cin)])
+                        enriched_records.append({**data, 'SOURCE': f"{data['SOURCE']}_STALE"})
+                    continue
+                
+                enriched_records.append(data)
+                if (source, cin) not in cached:
+                    fetched[(source, cin)] = data
+        
+        self._store_cached_responses([(source, cin, data) for (source, cin), data in fetched.items()])
         return enriched_records
     
+    def enrich_company(self, cin, company_name, sources=SOURCES):
+        """
+        Enrich a single company using multiple sources
+        """
+        # The sources are independent, so all of them are queried at once
+        return self._enrich_companies([(cin, company_name)], sources)
+    
     def enrich_sample_companies(self, companies_df, sample_size=50):
         """
         Enrich a sample of companies showing recent changes
@@ -146,48 +471,58 @@ class WebEnrichment:
         logger.info(f"Starting enrichment for {sample_size} companies")
         
         # Get sample of companies (prioritize recent changes)
-        sample_companies = companies_df.head(sample_size)
+        cins = companies_df['CIN'].to_numpy()[:sample_size]
+        company_names = companies_df['Company_Name'].to_numpy()[:sample_size]
         
-        all_enriched_data = []
+        companies = []
         
-        for idx, company in sample_companies.iterrows():
-            cin = company['CIN']
-            company_name = company['Company_Name']
-            
-            logger.info(f"Enriching company {idx+1}/{sample_size}: {company_name}")
-            
-            # Enrich from multiple sources
-            enriched_records = self.enrich_company(cin, company_name)
-            all_enriched_data.extend(enriched_records)
-            
-            # Add delay to avoid overwhelming external APIs
-            time.sleep(random.uniform(0.5, 1))
+        for position, (cin, company_name) in enumerate(zip(cins, company_names), start=1):
+            logger.info(f"Enriching company {position}/{sample_size}: {company_name}")
+            companies.append((cin, company_name))
+        
+        # Enrich from multiple sources
+        all_enriched_data = self._enrich_companies(companies, self.SOURCES)
         
         self.enriched_data = all_enriched_data
         logger.info(f"Enrichment completed. Total enriched records: {len(all_enriched_data)}")
         
         return all_enriched_data
     
-    def save_enriched_data(self, filename='enriched_company_data.csv'):
+    def _flat_records(self):
+        """
+        Yield each enriched record with its ENRICHED_DATA fields merged into the row
+        """
+        for record in self.enriched_data:
+            row = {key: value for key, value in record.items() if key != 'ENRICHED_DATA'}
+            row.update(record['ENRICHED_DATA'])
+            yield row
+    
+    def save_enriched_data(self, filename='enriched_company_data.csv', as_dataframe=False):
         """
-        Save enriched data to CSV file
+        Save enriched data to CSV file; with as_dataframe the table is built in pandas and returned
         """
         if not self.enriched_data:
             logger.warning("No enriched data to save")
             return
         
-        # Convert to DataFrame
-        df = pd.DataFrame(self.enriched_data)
+        if as_dataframe:
+            df = pd.DataFrame.from_records(list(self._flat_records()))
+            df.to_csv(filename, index=False)
+            logger.info(f"Enriched data saved to {filename}")
+            return df
+        
+        # Columns are every field in first-seen order; rows are streamed to the file as
+        # they are flattened, so only one row is held in memory at a time
+        fieldnames = list(dict.fromkeys(key for row in self._flat_records() for key in row))
         
-        # Flatten enriched_data column
-        enriched_df = pd.json_normalize(df['ENRICHED_DATA'])
-        df = pd.concat([df.drop('ENRICHED_DATA', axis=1), enriched_df], axis=1)
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator=os.linesep)
+            writer.writeheader()
+            writer.writerows(self._flat_records())
         
-        # Save to CSV
-        df.to_csv(filename, index=False)
         logger.info(f"Enriched data saved to {filename}")
         
-        return df
+        return filename
     
     def get_enrichment_summary(self):
         """
@@ -196,14 +531,24 @@ class WebEnrichment:
         if not self.enriched_data:
             return None
         
-        df = pd.DataFrame(self.enriched_data)
+        sources = Counter()
+        fields = Counter()
+        states = Counter()
+        cins = set()
+        
+        for record in self.enriched_data:
+            sources[record['SOURCE']] += 1
+            fields[record['FIELD']] += 1
+            states[record['STATE']] += 1
+            cins.add(record['CIN'])
         
+        # Most frequent first, as value_counts() reported them
         summary = {
-            'total_enriched_records': len(df),
-            'sources_used': df['SOURCE'].value_counts().to_dict(),
-            'fields_enriched': df['FIELD'].value_counts().to_dict(),
-            'states_covered': df['STATE'].value_counts().to_dict(),
-            'unique_companies': df['CIN'].nunique()
+            'total_enriched_records': len(self.enriched_data),
+            'sources_used': dict(sources.most_common()),
+            'fields_enriched': dict(fields.most_common()),
+            'states_covered': dict(states.most_common()),
+            'unique_companies': len(cins)
         }
         
         return summary
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for the MCA Insights Engine API
+
+Serve with a multi-worker server instead of the Flask development server:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from api import app
+
+if __name__ == "__main__":
+    app.run(host='0.0.0.0', port=5000)